@@ -12,7 +12,6 @@ CREATE TABLE job (
     qa_state CHAR(1) NOT NULL DEFAULT "?"
 );
 
-CREATE INDEX job_state ON job (state);
 CREATE UNIQUE INDEX job_tag ON job (tag);
 CREATE INDEX job_location ON job (location);
 CREATE INDEX job_foreign_id ON job (foreign_id);
@@ -20,6 +19,7 @@ CREATE UNIQUE INDEX job_location_id ON job (location, foreign_id);
 CREATE INDEX job_priority ON job (priority);
 CREATE INDEX job_task ON job (task);
 CREATE INDEX job_qa_state ON job (qa_state);
+CREATE INDEX job_state_location_priority ON job (state, location, priority);
 
 CREATE TABLE input_file (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -57,8 +57,8 @@ CREATE TABLE log (
         ON DELETE RESTRICT ON UPDATE RESTRICT
 );
 
-CREATE INDEX log_job_id ON log (job_id);
 CREATE INDEX log_state_new ON log (state_new);
+CREATE INDEX log_job_state_new ON log (job_id, state_new, datetime);
 
 CREATE TABLE obsidss (
   id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -70,6 +70,8 @@ CREATE TABLE obsidss (
 );
 
 CREATE UNIQUE INDEX job_id_obsidss ON obsidss (job_id, obsid_subsysnr);
+CREATE INDEX obsidss_job_obsid ON obsidss (job_id, obsid);
+CREATE INDEX obsidss_obsid ON obsidss (obsid);
 
 CREATE TABLE tile (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
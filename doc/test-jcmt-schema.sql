@@ -131,3 +131,9 @@ CREATE TABLE COMMON (
   oper_loc VARCHAR(70) DEFAULT NULL,
   oper_sft VARCHAR(70) DEFAULT NULL
 );
+
+-- Indexes to speed up the joins made by the tests.
+
+CREATE INDEX files_obsid_subsysnr ON FILES (obsid_subsysnr, obsid);
+
+CREATE INDEX common_obsid ON COMMON (obsid, utdate);
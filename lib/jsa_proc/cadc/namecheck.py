@@ -26,6 +26,7 @@ logger = logging.getLogger(__name__)
 namecheck_file = 'etc/namecheck.xml'
 namecheck_section = set(('RAW', 'PROCESSED'))
 namecheck_pattern = None
+namecheck_combined = None
 
 
 def check_file_name(filename, return_section=False):
@@ -42,14 +43,13 @@ def check_file_name(filename, return_section=False):
 
     file_id = filename.lower()
 
-    for (key, patterns) in _get_namecheck_pattern().items():
-        for pattern in patterns:
-            if pattern.match(file_id):
-                # Pattern matched: decide whether to return the section
-                # key or just True.
-                if return_section:
-                    return key
-                return True
+    for (key, pattern) in _get_namecheck_combined():
+        if pattern.match(file_id):
+            # Pattern matched: decide whether to return the section
+            # key or just True.
+            if return_section:
+                return key
+            return True
 
     if return_section:
         return None
@@ -95,3 +95,23 @@ def _get_namecheck_pattern():
                     logger.debug('Skipping namecheck section %s', key)
 
     return namecheck_pattern
+
+
+def _get_namecheck_combined():
+    """Get the namecheck patterns combined into one regular expression
+    per section.
+
+    Returns a list of (section, pattern) pairs, which is cached after
+    the first call.  This allows a file name to be tested against
+    all of the patterns in a section with a single match call.
+    """
+
+    global namecheck_combined
+
+    if namecheck_combined is None:
+        namecheck_combined = [
+            (key, re.compile('|'.join(
+                '(?:{0})'.format(pattern.pattern) for pattern in patterns)))
+            for (key, patterns) in _get_namecheck_pattern().items()]
+
+    return namecheck_combined
@@ -33,6 +33,9 @@ from jsa_proc.qa_state import JSAQAState
 
 logger = logging.getLogger(__name__)
 
+# Short name of the host on which we are running, for the log table.
+short_hostname = gethostname().partition('.')[0]
+
 # Named tuples that are created ahead of time instead of dynamically
 # defined from table rows:
 JSAProcLog = namedtuple(
@@ -72,6 +75,9 @@ JSAProcTaskInfo = namedtuple(
 # automatically.
 valid_column = re.compile('^[a-z0-9_]+$')
 
+# Query selecting all of the columns used to construct JSAProcJob tuples.
+job_select = 'SELECT ' + ', '.join(JSAProcJob._fields) + ' FROM job'
+
 
 class Not:
     """Class representing negative conditions.
@@ -161,6 +167,32 @@ class JSAProcDB:
 
         return job
 
+    def get_jobs(self, job_ids):
+        """
+        Get a number of JSA data processing jobs from the database.
+
+        This retrieves all of the given jobs with a single query.
+        Identifiers which do not match any job are ignored.
+
+        job_ids: list of integer job identifiers.
+
+        Returns: dictionary of JSAProcJob namedtuples by job identifier.
+        """
+
+        job_ids = list(job_ids)
+
+        if not job_ids:
+            return {}
+
+        with self.db as c:
+            c.execute(
+                job_select + ' WHERE id IN ' + _in_placeholders(len(job_ids)),
+                tuple(job_ids))
+
+            jobs = [JSAProcJob(*job) for job in c.fetchall()]
+
+        return dict((job.id, job) for job in jobs)
+
     def _get_job(self, c, name, value):
         """
         Private function to get a job from the database.
@@ -175,10 +207,7 @@ class JSAProcDB:
         Returns JSAProcJob named tuple.
         """
         # Get the values form the database
-        c.execute(
-            'SELECT ' +
-            ', '.join(JSAProcJob._fields) +
-            ' FROM job WHERE ' + name + '=%s', (value,))
+        c.execute(job_select + ' WHERE ' + name + '=%s', (value,))
         job = c.fetchall()
         if len(job) == 0:
             raise NoRowsError(
@@ -260,6 +289,62 @@ class JSAProcDB:
         Returns the job identifier.
         """
 
+        obsidss_files = self._get_obsidss_files(obsidss or ())
+
+        with self.db as c:
+            job_id = self._add_job(
+                c, tag, location, mode, parameters, task,
+                input_file_names=input_file_names, parent_jobs=parent_jobs,
+                filters=filters, foreign_id=foreign_id, state=state,
+                priority=priority, obsidss=obsidss, tilelist=tilelist,
+                obsidss_files=obsidss_files)
+
+        # job_id may not be necessary but sometimes useful.
+        return job_id
+
+    def add_jobs(self, jobs):
+        """
+        Add a number of JSA data processing jobs to the database.
+
+        All of the jobs are added in a single transaction, so if any of
+        them can not be added then none of them will be.  (Any "obsidss"
+        values are looked up in the JCMT database before this
+        transaction starts.)
+
+        jobs: iterable, each item being a dictionary of the arguments
+        which would be given to the add_job method for that job.
+
+        Returns a list of the job identifiers.
+        """
+
+        jobs = list(jobs)
+
+        obsidss_files = self._get_obsidss_files(
+            [x for job in jobs for x in (job.get('obsidss') or ())])
+
+        with self.db as c:
+            job_ids = [
+                self._add_job(c, obsidss_files=obsidss_files, **job)
+                for job in jobs]
+
+        return job_ids
+
+    def _add_job(self, c, tag, location, mode, parameters, task,
+                 input_file_names=None, parent_jobs=None, filters=None,
+                 foreign_id=None, state='?',
+                 priority=0, obsidss=None, tilelist=None,
+                 obsidss_files=None):
+        """
+        Private method to add a job to the database.
+
+        Takes a cursor object as argument "c" (assumes the database
+        is already locked) and otherwise the same arguments as add_job.
+        If "obsidss" is given, "obsidss_files" must be the result of
+        _get_obsidss_files for (at least) those values.
+
+        Returns the job identifier.
+        """
+
         # Validate input.
         if not JSAProcState.is_valid(state):
             raise JSAProcError('State {0} is not recognised'.format(state))
@@ -272,55 +357,60 @@ class JSAProcDB:
             job_id, parents, filters = _validate_parents(None, parent_jobs,
                                                          filters=filters)
 
-        with self.db as c:
-            # Check if the tag already exists.  The database constraints
-            # should already check for this, but with MySQL's InnoDB
-            # engine, a job number is allocated (and lost) if the
-            # insert constraint fails.
-            c.execute('SELECT COUNT(*) FROM job WHERE tag=%s', (tag,))
-            row = c.fetchone()
-            if row[0] != 0:
-                raise JSAProcError('a job already exists with the same tag: ' +
-                                   tag)
-
-            # Insert job into table
-            c.execute(
-                'INSERT INTO job '
-                '(tag, state, location, mode, parameters, '
-                'foreign_id, priority, task) '
-                'VALUES (%s, %s, %s, %s, %s, %s, %s, %s)',
-                (tag, state, location, mode, parameters, foreign_id,
-                 priority, task))
-
-            # Get the autoincremented id from job table (job_id in all other
-            # tables).
-            job_id = c.lastrowid
-
-            # Add parent jobs to parent table with filters.
-            if parent_jobs:
-                # Check job_id is not contained within parent_list
-                if job_id in parent_jobs:
-                    raise JSAProcError('Cannot insert a job as its own parent')
+        # Check for repeated input files before inserting the job, for
+        # the same reason as the tag check below.
+        if input_file_names:
+            input_file_names = list(input_file_names)
+            if len(set(input_file_names)) != len(input_file_names):
+                raise JSAProcError('An input file was given more than once')
+
+        # Check if the tag already exists.  The database constraints
+        # should already check for this, but with MySQL's InnoDB
+        # engine, a job number is allocated (and lost) if the
+        # insert constraint fails.
+        c.execute('SELECT COUNT(*) FROM job WHERE tag=%s', (tag,))
+        row = c.fetchone()
+        if row[0] != 0:
+            raise JSAProcError('a job already exists with the same tag: ' +
+                               tag)
+
+        # Insert job into table
+        c.execute(
+            'INSERT INTO job '
+            '(tag, state, location, mode, parameters, '
+            'foreign_id, priority, task) '
+            'VALUES (%s, %s, %s, %s, %s, %s, %s, %s)',
+            (tag, state, location, mode, parameters, foreign_id,
+             priority, task))
+
+        # Get the autoincremented id from job table (job_id in all other
+        # tables).
+        job_id = c.lastrowid
+
+        # Add parent jobs to parent table with filters.
+        if parent_jobs:
+            # Check job_id is not contained within parent_list
+            if job_id in parent_jobs:
+                raise JSAProcError('Cannot insert a job as its own parent')
 
-                self._insert_parents(job_id, c, parent_jobs, filters)
+            self._insert_parents(job_id, c, parent_jobs, filters)
 
-            # Add input file names to input_file table.
-            if input_file_names:
-                self._set_input_files(c, job_id, input_file_names)
+        # Add input file names to input_file table.
+        if input_file_names:
+            self._set_input_files(c, job_id, input_file_names)
 
-            # Log the job creation
-            self._add_log_entry(c, job_id, JSAProcState.UNKNOWN, state,
-                                'Job added to the database', None)
+        # Log the job creation
+        self._add_log_entry(c, job_id, JSAProcState.UNKNOWN, state,
+                            'Job added to the database', None)
 
-            # If present, insert the tile list.
-            if tilelist:
-                self._set_tilelist(c, job_id, tilelist)
+        # If present, insert the tile list.
+        if tilelist:
+            self._set_tilelist(c, job_id, tilelist)
 
-            # If present, replace/update the observation list.
-            if obsidss:
-                self._set_obsidss(c, job_id, obsidss, False)
+        # If present, replace/update the observation list.
+        if obsidss:
+            self._set_obsidss(c, job_id, obsidss, False, obsidss_files)
 
-        # job_id may not be necessary but sometimes useful.
         return job_id
 
     def get_tilelist(self, job_id=None, task=None):
@@ -371,10 +461,9 @@ class JSAProcDB:
 
     def _set_tilelist(self, c, job_id, tiles):
         c.execute('DELETE FROM tile WHERE job_id = %s', (job_id,))
-        for tile in tiles:
-            c.execute('INSERT INTO tile (job_id, tile) '
+        c.executemany('INSERT INTO tile (job_id, tile) '
                       'VALUES (%s, %s)',
-                      (job_id, tile))
+                      [(job_id, tile) for tile in tiles])
 
     def change_task(self, job_id, oldtask, newtask):
         """
@@ -469,41 +558,71 @@ class JSAProcDB:
         If set True, delete all existing entries for the job_id before
         updating the table with the obsinfo dictionaries.
         """
+        obsidss_files = self._get_obsidss_files(obsidss)
+
         with self.db as c:
-            self._set_obsidss(c, job_id, obsidss, replace_all)
+            self._set_obsidss(c, job_id, obsidss, replace_all, obsidss_files)
 
-    def _set_obsidss(self, c, job_id, obsidss, replace_all):
+    def _get_obsidss_files(self, obsidss):
+        """
+        Private method to look up obsidss values in jcmt.FILES.
 
-        # If replace_all is set, then delete the existing observations.
-        if replace_all:
-            c.execute('DELETE FROM obsidss WHERE job_id = %s', (job_id,))
+        This uses its own database block because the tables must be
+        unlocked to read the JCMT database, which (with MySQL) would
+        commit any transaction in progress.  It should therefore be
+        called before entering the block which will use the results.
 
-        # Get the obsid from jcmt.FILES
-        self.db.unlock()
+        Returns a dictionary, by obsidss, of lists of
+        (obsid_subsysnr, obsid, subsysnr) tuples.
+        """
 
-        query = 'SELECT obsid_subsysnr, obsid, subsysnr FROM jcmt.FILES WHERE obsid_subsysnr IN ({0}) GROUP BY obsid_subsysnr, obsid'.format(
-            ', '.join(('%s',)*len(obsidss)))
+        obsidss_files = {}
 
-        c.execute(query, tuple(obsidss))
+        obsidss = set(obsidss)
+        if not obsidss:
+            return obsidss_files
 
-        results = c.fetchall()
+        query = 'SELECT obsid_subsysnr, obsid, subsysnr FROM jcmt.FILES WHERE obsid_subsysnr IN {0} GROUP BY obsid_subsysnr, obsid'.format(
+            _in_placeholders(len(obsidss)))
+
+        with self.db as c:
+            self.db.unlock()
+
+            c.execute(query, tuple(obsidss))
 
+            for row in c.fetchall():
+                obsidss_files.setdefault(row[0], []).append(tuple(row))
+
+        return obsidss_files
+
+    def _set_obsidss(self, c, job_id, obsidss, replace_all, obsidss_files):
+        """
+        Private method to set the observations for a job.
+
+        Takes a cursor object as argument "c" and the result of
+        _get_obsidss_files for the given obsidss values.
+        """
+
+        # If replace_all is set, then delete the existing observations.
+        if replace_all:
+            c.execute('DELETE FROM obsidss WHERE job_id = %s', (job_id,))
+
+        results = [
+            row for o in set(obsidss) for row in obsidss_files.get(o, ())]
 
         # Check if any are missing, and warn if so.
-        obsidss_fromquery = [i[0] for i in results]
         for o in obsidss:
-            if o not in obsidss_fromquery:
+            if o not in obsidss_files:
                 logger.warning(
                     'OBSIDSS %s was not added to job %i as no matching OBSID was found in jcmt FILES Table',
                     o, job_id)
 
         # Go through each pair of obsid_subsysnr and obsid, and insert
         # into obsidss for current job.
-        for (obsid_subsysnr, obsid, subsys) in results:
-
-            c.execute('INSERT INTO obsidss (job_id, obsid_subsysnr, obsid, subsys) ' +
+        c.executemany('INSERT INTO obsidss (job_id, obsid_subsysnr, obsid, subsys) ' +
                       ' VALUES (%s, %s, %s, %s)' ,
-                      (job_id, obsid_subsysnr, obsid, subsys))
+                      [(job_id, obsid_subsysnr, obsid, subsys)
+                       for (obsid_subsysnr, obsid, subsys) in results])
 
 
     def change_state(self, job_id, newstate, message, state_prev=None,
@@ -539,6 +658,25 @@ class JSAProcDB:
             self._change_state(c, job_id, newstate, message, state_prev,
                                username, priority)
 
+    def change_states(self, changes, username=None):
+        """
+        Change the states of a number of jobs in the JSA processing database.
+
+        All of the changes are made in a single transaction, in the order
+        given, so if any of them fails then none of them will be applied.
+
+        Parameters:
+        changes: iterable of (job_id, newstate, message) tuples,
+        each as would be given to the change_state method.
+
+        username: the user name to record in the log entries.
+        """
+
+        with self.db as c:
+            for (job_id, newstate, message) in changes:
+                self._change_state(c, job_id, newstate, message, None,
+                                   username, None)
+
     def _change_state(self, c, job_id, newstate, message, state_prev,
                       username, priority):
         # Validate input.
@@ -581,30 +719,34 @@ class JSAProcDB:
         elif c.rowcount > 1:
             raise ExcessRowsError('job', query % tuple(param))
 
-        # Get state_prev value if we were not given it.
-        if state_prev is None:
-            c.execute('SELECT state_prev FROM job WHERE id=%s',
+        # Get the state_prev value if we were not given it, and the
+        # current QA state if it may need to be reset, in a single query.
+        reset_qa = newstate in JSAProcState.STATE_PRE_QA
+
+        if state_prev is None or reset_qa:
+            c.execute('SELECT state_prev, qa_state FROM job WHERE id=%s',
                       (job_id,))
-            state_prev = c.fetchall()
+            job_states = c.fetchall()
 
-            if len(state_prev) > 1:
+            if len(job_states) > 1:
                 raise ExcessRowsError(
                     'job',
-                    'SELECT state_prev FROM job WHERE id=%s' % (job_id))
+                    'SELECT state_prev, qa_state FROM job WHERE id=%s' %
+                    (job_id))
+
+            (job_state_prev, qa_state) = job_states[0]
 
-            state_prev = state_prev[0][0]
+            if state_prev is None:
+                state_prev = job_state_prev
 
         # Update log table.
         self._add_log_entry(c, job_id, state_prev, newstate, message, username)
 
         # Update QA table if appropriate
-        if newstate in JSAProcState.STATE_PRE_QA:
-            # Check the current QA state:
-            job = self._get_job(c, 'id', job_id)
-
+        if reset_qa:
             # If a non-unknown QA state has been set, change it to unknown
             # and update the qa table.
-            if job.qa_state != JSAQAState.UNKNOWN:
+            if qa_state != JSAQAState.UNKNOWN:
                 c.execute('UPDATE job SET qa_state = %s WHERE id= %s',
                           (JSAQAState.UNKNOWN, job_id))
                 self._add_qa_entry(c, job_id, JSAQAState.UNKNOWN,
@@ -612,7 +754,7 @@ class JSAProcDB:
                                    ' QA state reset automatically.',
                                    getuser())
 
-    def get_input_files(self, job_id):
+    def get_input_files(self, job_id, sort=False):
         """
         Get the list of input files for specific job from the
         input_file table.
@@ -620,12 +762,18 @@ class JSAProcDB:
         takes integer job_id to identify file (this is the
         auto-incremented primary key from the job table)
 
+        If sort is specified, the files are sorted by name.
+
         Returns a list of file names.
         """
 
+        query = 'SELECT filename FROM input_file WHERE job_id=%s'
+
+        if sort:
+            query += ' ORDER BY filename'
+
         with self.db as c:
-            c.execute('SELECT filename FROM input_file WHERE job_id=%s',
-                      (job_id,))
+            c.execute(query, (job_id,))
             input_files = c.fetchall()
 
             if len(input_files) == 0:
@@ -653,10 +801,9 @@ class JSAProcDB:
         c.execute('DELETE FROM input_file WHERE job_id = %s', (job_id,))
 
         # Insert the new input file records.
-        for filename in input_files:
-            c.execute('INSERT INTO input_file (job_id, filename) '
+        c.executemany('INSERT INTO input_file (job_id, filename) '
                       'VALUES (%s, %s)',
-                      (job_id, filename))
+                      [(job_id, filename) for filename in input_files])
 
     def _add_log_entry(self, c, job_id, state_prev, state_new, message,
                        username):
@@ -673,7 +820,7 @@ class JSAProcDB:
                   '(job_id, state_prev, state_new, message, host, username) '
                   'VALUES (%s, %s, %s, %s, %s, %s)',
                   (job_id, state_prev, state_new, message,
-                   gethostname().partition('.')[0], username))
+                   short_hostname, username))
 
     def _add_qa_entry(self, c, job_id, status, message, username):
         """
@@ -764,14 +911,14 @@ class JSAProcDB:
             c.execute("SELECT * FROM " + tablename + " WHERE job_id = %s " +
                       "ORDER BY id DESC LIMIT 1",
                       (job_id,))
-            entry = c.fetchall()
-        if len(entry) < 1:
+            entry = c.fetchone()
+        if entry is None:
             raise NoRowsError(
                 'job',
                 'SELECT * FROM ' + tablename +
                 ' WHERE job_id = %i ORDER BY id DESC LIMIT 1' % (job_id))
 
-        return entry[0]
+        return entry
 
     def get_last_qa(self, job_id):
         """
@@ -908,7 +1055,7 @@ class JSAProcDB:
 
         return times
 
-    def get_output_files(self, job_id, with_info=False):
+    def get_output_files(self, job_id, with_info=False, sort=False):
         """
         Get the output file list for a job.
 
@@ -919,6 +1066,8 @@ class JSAProcDB:
         with_info: choose whether to retrieve full information
         or just the file names (which is the default).
 
+        sort: if specified, sort the files by name.
+
         Returns:
         list of output files unless with_info is enabled, in which
         case a list of JSAProcFileInfo namedtuples is returned.
@@ -926,10 +1075,13 @@ class JSAProcDB:
         Will raise an NoRowsError if there are no output files found.
         """
 
+        query = 'SELECT filename, md5 FROM output_file WHERE job_id = %s'
+
+        if sort:
+            query += ' ORDER BY filename'
+
         with self.db as c:
-            c.execute(
-                'SELECT filename, md5 FROM output_file WHERE job_id = %s',
-                (job_id,))
+            c.execute(query, (job_id,))
             output_files = c.fetchall()
             if len(output_files) == 0:
                 raise NoRowsError(
@@ -968,11 +1120,10 @@ class JSAProcDB:
             # First of all blank out any current output files for this job_id.
             c.execute('DELETE FROM output_file WHERE job_id = %s', (job_id,))
 
-            for f in output_files:
-                # Now add in the new output files, one at a time.
-                c.execute('INSERT INTO output_file (job_id, filename, md5) '
+            # Now add in the new output files.
+            c.executemany('INSERT INTO output_file (job_id, filename, md5) '
                           'VALUES (%s, %s, %s)',
-                          (job_id, f.filename, f.md5))
+                          [(job_id, f.filename, f.md5) for f in output_files])
 
     def get_log_files(self, job_id):
         """
@@ -1023,11 +1174,10 @@ class JSAProcDB:
             # First of all blank out any current output files for this job_id.
             c.execute('DELETE FROM log_file WHERE job_id = %s', (job_id,))
 
-            for f in log_files:
-                # Now add in the new output files, one at a time.
-                c.execute('INSERT INTO log_file (job_id, filename) '
+            # Now add in the new log files.
+            c.executemany('INSERT INTO log_file (job_id, filename) '
                           'VALUES (%s, %s)',
-                          (job_id, f))
+                          [(job_id, f) for f in log_files])
 
     def find_errors_logs(self, location=None, task=None, state_prev=None,
                          error_state=JSAProcState.ERROR):
@@ -1067,19 +1217,19 @@ class JSAProcDB:
             c.execute(query, param)
             error_jobs = c.fetchall()
 
-            edict = OrderedDict()
-            for j in error_jobs:
-                einfo = JSAProcErrorInfo(*j)
-                edict[einfo.id] = edict.get(einfo.id, []) + [einfo]
+        # Group the log entries by job.
+        edict = OrderedDict()
+        for j in error_jobs:
+            einfo = JSAProcErrorInfo(*j)
+            edict.setdefault(einfo.id, []).append(einfo)
 
         return edict
-        # Now sort out error jobs in sensible option
 
     def find_jobs(self, state=None, location=None, task=None, qa_state=None,
                   tag=None, state_prev=None,
                   prioritize=False, number=None, offset=None,
                   sort=False, sortdir='ASC', outputs=None, count=False,
-                  obsquery=None, tiles=None):
+                  obsquery=None, tiles=None, fields=None):
         """Retrieve a list of jobs matching the given values.
 
         Searches by the following values:
@@ -1103,6 +1253,8 @@ class JSAProcDB:
               get output_files that match the string. e.g. '%preview_1024.png'
               would include all 1024 size preview images with jobs.
               If this argument is None then no outputs will be fetched.)
+            * fields (list of job table columns to retrieve instead of
+              the usual namedtuples, cannot be combined with outputs)
 
         In addition the jobs returned can be affected by an optional
         obsquery parameter. If given, this must be a dictionary of
@@ -1121,6 +1273,8 @@ class JSAProcDB:
             * qa_state
             * outputs (list)
 
+        If the fields parameter is given, returns a list of namedtuples
+        with only those columns (even if only one field was requested).
         """
 
         param = []
@@ -1128,6 +1282,25 @@ class JSAProcDB:
 
         if count is True:
             query = 'SELECT COUNT(*)'
+        elif fields is not None:
+            if outputs:
+                raise JSAProcError('Can not select fields and outputs '
+                                   'from find_jobs together')
+
+            if not fields:
+                raise JSAProcError('No fields specified for find_jobs')
+
+            seen_fields = set()
+            for field in fields:
+                if field not in JSAProcJob._fields:
+                    raise JSAProcError('Unknown job field: %s' % (field,))
+                if field in seen_fields:
+                    raise JSAProcError('Repeated job field: %s' % (field,))
+                seen_fields.add(field)
+
+            query = 'SELECT ' + ', '.join('job.' + x for x in fields)
+
+            row_type = _job_fields_type(fields)
         else:
             query = 'SELECT job.id, job.tag, job.state, job.location, ' \
                     'job.foreign_id, job.task, job.qa_state'
@@ -1198,6 +1371,11 @@ class JSAProcDB:
                 if row is None:
                     break
 
+                # If specific fields were requested, return only those.
+                if fields is not None:
+                    result.append(row_type(*row))
+                    continue
+
                 # Turn the row into a namedtuple.
 
                 row = JSAProcJobInfo(*row)
@@ -1563,10 +1741,10 @@ class JSAProcDB:
 
     def _insert_parents(self, job_id, c, parents, filters):
 
-        for parent, filt in zip(parents, filters):
-            c.execute('INSERT INTO parent (job_id, parent, filter) '
+        c.executemany('INSERT INTO parent (job_id, parent, filter) '
                       'VALUES (%s, %s, %s)',
-                      (job_id, parent, filt))
+                      [(job_id, parent, filt)
+                       for parent, filt in zip(parents, filters)])
 
     def delete_some_parents(self, job_id, parents):
         """
@@ -1736,15 +1914,87 @@ def _dict_query_where_clause(table, wheredict, logic_or=False):
     if not valid_column.match(table) and not table in ['jcmt.COMMON']:
         raise JSAProcError('Invalid table name "{0}"'.format(table))
 
-    where = []
+    # Determine the "shape" of the query, which is all that is required
+    # to construct the SQL, and collect the parameters.  The sizes of
+    # IN expressions are kept separately so that they do not affect
+    # the shape.
+    shape = []
     params = []
+    in_sizes = []
     for key, value in wheredict.items():
-        table_key = '{0}.`{1}`'.format(table, key)
         # Column names can only use valid characters.
         if not valid_column.match(key):
             raise JSAProcError('Non allowed column name %s for SQL matching' %
                                (str(key)))
 
+        if isinstance(value, Not):
+            value = value.value
+            logic_not = True
+        else:
+            logic_not = False
+
+        if value is None:
+            shape.append((key, logic_not, 'null', None))
+
+        elif isinstance(value, Range):
+            shape.append((key, logic_not, 'range',
+                          (value.min is not None, value.max is not None)))
+            params.extend(x for x in value if x is not None)
+
+        elif isinstance(value, Fuzzy):
+            shape.append((key, logic_not, 'fuzzy', None))
+            params.append(
+                '%{0}%'.format(value.value)
+                if value.wildcards else
+                value.value)
+
+        elif isinstance(value, basestring) or not hasattr(value, '__iter__'):
+            shape.append((key, logic_not, 'equal', None))
+            params.append(value)
+
+        else:
+            shape.append((key, logic_not, 'in', len(in_sizes)))
+            in_sizes.append(len(value))
+            params.extend(value)
+
+    where = _dict_query_where_template(table, tuple(shape), logic_or)
+
+    if not where:
+        return ('', [])
+
+    if in_sizes:
+        where = where.format(*[_in_placeholders(n) for n in in_sizes])
+
+    return (where, params)
+
+
+_where_template_cache = {}
+
+
+def _dict_query_where_template(table, shape, logic_or):
+    """Construct the SQL for a _dict_query_where_clause query.
+
+    Since the same queries are made repeatedly, the SQL is stored
+    in a cache, keyed by the table, logic and query "shape".  The
+    placeholder lists for IN expressions are left as format fields
+    numbered by the "extra" value of the shape entry, so that the
+    number of values does not need to be part of the shape.
+
+    Returns the WHERE expression, or an empty string if there
+    are no conditions.
+    """
+
+    cache_key = (table, shape, logic_or)
+
+    try:
+        return _where_template_cache[cache_key]
+    except KeyError:
+        pass
+
+    where = []
+    for (key, logic_not, kind, extra) in shape:
+        table_key = '{0}.`{1}`'.format(table, key)
+
         # Fix up column names (due to switch from jsa_proc.obs to using jcmt.COMMON
         if table == 'jcmt.COMMON':
             if key == 'obstype':
@@ -1754,42 +2004,28 @@ def _dict_query_where_clause(table, wheredict, logic_or=False):
             if key == 'tau':
                 table_key = '(jcmt.COMMON.wvmtaust+jcmt.COMMON.wvmtauen)/2.0'
 
-
-
-        if isinstance(value, Not):
-            value = value.value
-            logic_not = True
-        else:
-            logic_not = False
-
-        if value is None:
+        if kind == 'null':
             where.append(
                 '{0} IS {1}'.format(table_key,
                                     'NOT NULL' if logic_not else 'NULL'))
 
+        elif kind == 'range':
+            (has_min, has_max) = extra
 
-        elif isinstance(value, Range):
-            if value.min is None and value.max is None:
-                pass
-
-            elif value.min is not None and value.max is not None:
+            if has_min and has_max:
                 where.append(
                     '{0} {1} %s AND %s'.format(
                         table_key, 'NOT BETWEEN' if logic_not else 'BETWEEN'))
-                params.extend(value)
-
-            else:
-                if value.min is not None:
-                    params.append(value.min)
-                    range_op = '<' if logic_not else '>='
 
-                elif value.max is not None:
-                    params.append(value.max)
-                    range_op = '>' if logic_not else '<='
+            elif has_min:
+                where.append('{0} {1} %s'.format(
+                    table_key, '<' if logic_not else '>='))
 
-                where.append('{0} {1} %s'.format(table_key, range_op))
+            elif has_max:
+                where.append('{0} {1} %s'.format(
+                    table_key, '>' if logic_not else '<='))
 
-        elif isinstance(value, Fuzzy):
+        elif kind == 'fuzzy':
             # Not really very fuzzy, but for now implement this as a LIKE
             # expression with wildcards at both ends (LIKE is case
             # insensitive).
@@ -1798,34 +2034,81 @@ def _dict_query_where_clause(table, wheredict, logic_or=False):
                 if logic_not else
                 '{0} LIKE %s'
                 ).format(table_key))
-            params.append(
-                '%{0}%'.format(value.value)
-                if value.wildcards else
-                value.value)
 
-        elif isinstance(value, basestring) or not hasattr(value, '__iter__'):
+        elif kind == 'equal':
             # If string or non iterable object, use simple comparison.
             where.append((
                 '({0}<>%s OR {0} IS NULL)'
                 if logic_not else
                 '{0}=%s'
                 ).format(table_key))
-            params.append(value)
 
         else:
             # Otherwise use an IN expression.
             where.append((
-                '({0} NOT IN ({1}) OR {0} IS NULL)'
+                '({0} NOT IN {1} OR {0} IS NULL)'
                 if logic_not else
-                '{0} IN ({1})'
-                ).format(table_key, ', '.join(('%s',) * len(value))))
-            params.extend(value)
+                '{0} IN {1}'
+                ).format(table_key, '{' + str(extra) + '}'))
 
-    if not where:
-        return ('', [])
+    if where:
+        where = '({0})'.format(
+            (' OR ' if logic_or else ' AND ').join(where))
+    else:
+        where = ''
+
+    _where_template_cache[cache_key] = where
+    return where
+
+
+# Largest IN expression for which the placeholder list is cached.  Longer
+# lists are rare and their lengths vary, so are not worth keeping.
+in_placeholder_cache_max = 100
+
+_in_placeholder_cache = {}
+
+
+def _in_placeholders(n):
+    """Get a parenthesized list of n placeholders for an IN expression.
+
+    These are cached by the number of placeholders (up to
+    in_placeholder_cache_max), as the same numbers tend to be
+    requested repeatedly.
+    """
+
+    try:
+        return _in_placeholder_cache[n]
+    except KeyError:
+        pass
+
+    placeholders = '(' + ', '.join(('%s',) * n) + ')'
+
+    if n <= in_placeholder_cache_max:
+        _in_placeholder_cache[n] = placeholders
+
+    return placeholders
+
+
+_job_fields_type_cache = {}
+
+
+def _job_fields_type(fields):
+    """Get a namedtuple type for the given job table columns.
+
+    These are cached by the tuple of column names, which is limited to
+    the combinations requested by callers of find_jobs.
+    """
+
+    fields = tuple(fields)
+
+    try:
+        return _job_fields_type_cache[fields]
+    except KeyError:
+        pass
 
-    where = (' OR ' if logic_or else ' AND ').join(where)
-    return ('({0})'.format(where), params)
+    row_type = _job_fields_type_cache[fields] = \
+        namedtuple('JSAProcJobFields', fields)
+    return row_type
 
 
 def _validate_parents(job_id, parents, filters=None):
@@ -31,6 +31,7 @@ class JSAProcMySQLLock():
         self._lock = Lock()
         self._conn = conn
         self._tables = None
+        self._lock_query = None
 
         with self as c:
             result = []
@@ -47,6 +48,10 @@ class JSAProcMySQLLock():
 
         self._tables = result
 
+        # Prepare the table locking statement once, since it is the same
+        # for every block.
+        self._lock_query = 'LOCK TABLES ' + ', '.join(
+            [x + ' WRITE' for x in self._tables])
 
     def __enter__(self):
         """Context manager block entry method."""
@@ -58,12 +63,8 @@ class JSAProcMySQLLock():
 
         self._cursor = self._conn.cursor()
 
-        if self._tables is not None:
-            self._cursor.execute(
-                'LOCK TABLES ' +
-                ', '.join([x + ' WRITE' for x in self._tables] #+ 
-                          #[x + ' READ' for x in self._readonlytables]
-                      ))
+        if self._lock_query is not None:
+            self._cursor.execute(self._lock_query)
 
 
 
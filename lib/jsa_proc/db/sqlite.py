@@ -27,6 +27,11 @@ from jsa_proc.error import JSAProcError
 # to also be used for "DATETIME" columns.
 sqlite3.register_converter('DATETIME', sqlite3.converters['TIMESTAMP'])
 
+# Maximum number of converted queries to store in each cursor class's cache.
+# JSAProcDB issues fewer than a hundred distinct fixed queries, so this
+# leaves room for those with IN expressions of varying lengths.
+query_cache_max = 500
+
 
 def add_types(query):
     """Add type information where needed for SQLite.
@@ -46,6 +51,39 @@ def add_types(query):
     return query
 
 
+def _cached_query(cache, query, convert):
+    """Convert a query for SQLite, reusing previous conversions.
+
+    The same queries are issued many times, so the converted form of
+    each is stored in the given cache dictionary.  (The cache is cleared
+    if it reaches query_cache_max entries, since some queries have
+    a variable number of placeholders.)
+    """
+
+    try:
+        return cache[query]
+    except KeyError:
+        pass
+
+    if len(cache) >= query_cache_max:
+        cache.clear()
+
+    converted = cache[query] = convert(query)
+    return converted
+
+
+def _convert_format_query(query):
+    """Convert a format-style query for SQLite."""
+
+    return add_types(re.sub('\%s', '?', query))
+
+
+def _convert_at_query(query):
+    """Convert an at-style query for SQLite."""
+
+    return add_types(re.sub('\@[a-z]+', '?', query))
+
+
 class FormatCursor(sqlite3.Cursor):
     """Custom SQLite cursor class.
 
@@ -53,6 +91,8 @@ class FormatCursor(sqlite3.Cursor):
     aims to improve compatability with MySQL.
     """
 
+    _query_cache = {}
+
     def execute(self, query, *args, **kwargs):
         """
         Overridden execute method.
@@ -61,10 +101,20 @@ class FormatCursor(sqlite3.Cursor):
         marks (?).  This allows queries intended for MySQL to be used
         with SQLite.
         """
-        query = re.sub('\%s', '?', query)
-        query = add_types(query)
+        query = _cached_query(
+            self._query_cache, query, _convert_format_query)
         return sqlite3.Cursor.execute(self, query, *args, **kwargs)
 
+    def executemany(self, query, *args, **kwargs):
+        """
+        Overridden executemany method.
+
+        Replaces parameter placeholders as for the execute method.
+        """
+        query = _cached_query(
+            self._query_cache, query, _convert_format_query)
+        return sqlite3.Cursor.executemany(self, query, *args, **kwargs)
+
 
 class AtCursor(sqlite3.Cursor):
     """Custom SQLite cursor class.
@@ -73,14 +123,15 @@ class AtCursor(sqlite3.Cursor):
     aims to improve compatability with Sybase.
     """
 
+    _query_cache = {}
+
     def execute(self, query, *args, **kwargs):
         # We really need to get the list of placeholders so we can extract
         # the values from the dictionary in the right order.  However for
         # now assume there are either 0 or 1 placeholders, in which case
         # we can simply replace the placeholder and use the single argument
         # if present.
-        query = re.sub('\@[a-z]+', '?', query)
-        query = add_types(query)
+        query = _cached_query(self._query_cache, query, _convert_at_query)
         if args:
             args = (args[0].values(),)
             if len(args) > 1:
@@ -164,9 +215,13 @@ class JSAProcSQLite(JSAProcDB):
             if filename != ':memory:' and 'mode=memory' not in filename and not os.path.exists(filename):
                 raise Exception('SQLite file ' + filename + ' not found')
 
+        # The sqlite3 module keeps a cache of prepared statements for
+        # each connection.  Allow this to be large enough to hold
+        # all of the distinct queries issued by the JSAProcDB class.
         conn = sqlite3.connect(
             filename, check_same_thread=False,
-            detect_types=(sqlite3.PARSE_DECLTYPES | sqlite3.PARSE_COLNAMES))
+            detect_types=(sqlite3.PARSE_DECLTYPES | sqlite3.PARSE_COLNAMES),
+            cached_statements=512)
 
         c = conn.cursor()
         c.execute('PRAGMA foreign_keys = ON')
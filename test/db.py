@@ -13,116 +13,161 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import re
 from unittest import TestCase
 
 from jsa_proc.db.sqlite import JSAProcSQLite
-import os
 from datetime import datetime
-schema = None
+schemas = {}
+dummy_database = None
 
+# Statements used to add observations to the attached JCMT database.
+jcmt_files_insert = \
+    'INSERT INTO jcmt.FILES ' \
+    '(file_id, obsid, subsysnr, nsubscan, obsid_subsysnr) ' \
+    'VALUES (%s, %s, %s, 100, %s)'
+jcmt_common_insert = \
+    'INSERT INTO jcmt.COMMON ' \
+    '(obsid, utdate, obsnum, instrume, backend, survey, project, date_obs) ' \
+    'VALUES (%s, %s, %s, %s, %s, %s, %s, %s)'
 
-def create_dummy_database():
-    """Create an in-memory SQLite database from the schema."""
 
-    global schema
+def read_schema(filename):
+    """Read a database schema file, caching its contents."""
+
+    schema = schemas.get(filename)
 
     if schema is None:
-        with open('doc/schema.sql') as f:
-            schema = f.read()
+        with open(filename) as f:
+            schema = schemas[filename] = f.read()
+
+    return schema
+
+
+def attached_schema(schema, name):
+    """Qualify the tables and indexes in a schema with the
+    name of an attached database."""
+
+    return re.sub(r'CREATE (TABLE|INDEX|UNIQUE INDEX) (\w+)',
+                  r'CREATE \1 {0}.\2'.format(name), schema)
+
+
+def create_dummy_database():
+    """Create an in-memory SQLite database from the schema.
+
+    The JCMT and OMP databases are also created in memory and
+    attached to the main database.  As nothing is written to disk,
+    journaling and synchronization are also turned down.
+    """
 
     db = JSAProcSQLite(':memory:')
 
     with db.db as c:
-        c.executescript(schema)
+        c.execute('PRAGMA journal_mode=MEMORY')
+        c.execute('PRAGMA synchronous=OFF')
+        c.execute('PRAGMA temp_store=MEMORY')
 
+    with db.db as c:
+        c.executescript(read_schema('doc/schema.sql'))
 
-    # Can't have 2 databases in memory
-    with open('doc/test-jcmt-schema.sql') as f:
-        jcmtschema = f.read()
+    with db.db as c:
+        c.execute('ATTACH DATABASE ":memory:" AS jcmt')
+        c.execute('ATTACH DATABASE ":memory:" AS omp')
 
-    db2 = JSAProcSQLite('tmpjcmtfile.db', file_already_exists=False)
-    with db2.db as c:
-        c.executescript(jcmtschema)
+    with db.db as c:
+        c.executescript(attached_schema(
+            read_schema('doc/test-jcmt-schema.sql'), 'jcmt'))
+        c.executescript(attached_schema(
+            read_schema('doc/test-omp-schema.sql'), 'omp'))
 
-        # Insert test data into database.
-        info_1 = {'obsid': '1', 'obsidss': '1-1', 'utdate': 20140101,
-                  'obsnum': 1, 'instrume': 'F', 'backend': 'B',
-                  'subsys': '1', 'survey': 'GBS', 'project': 'G01',
-                  'date_obs': datetime(2014, 1, 1, 10, 0, 0), 'filename': 'test1'}
+    return db
 
-        info_2 = info_1.copy()
-        info_2.update(obsidss='1-2', subsys=2, filename='test2')
 
-        info_3 = info_1.copy()
-        info_3.update(obsid='2', obsidss='2-3', survey='DDS', project='D01', filename='test3')
+def get_dummy_database():
+    """Get the dummy database shared by all of the tests.
 
-        info_4 = info_1.copy()
-        info_4.update(obsid='3',obsidss='3-4',survey=None, project='XX01', filename='test4')
+    The database is created the first time this function is called,
+    and the same object is returned to all callers.
+    """
 
-        info_5 = info_4.copy()
-        info_5.update(obsid='4',obsidss='4-5',project='JCMTCAL', filename='test5',)
+    global dummy_database
 
-        info_6 = info_4.copy()
-        info_6.update(obsid='5', obsidss='5-6', project='CAL', filename='test6',)
+    if dummy_database is None:
+        dummy_database = create_dummy_database()
 
-        info_7 = info_1.copy()
-        info_7.update(obsid='6', obsidss='6-7', project='JCMTCAL', filename='test7')
-        for obs in (info_1, info_2, info_3, info_4, info_5, info_6, info_7):
-            c.execute('INSERT INTO FILES (file_id, obsid, subsysnr, nsubscan, obsid_subsysnr) ' +
-                      'VALUES (%s, %s, %s, 100, %s)',
-                      (obs['filename'], obs['obsid'], obs['subsys'], obs['obsidss']))
-            c.execute('INSERT INTO COMMON (obsid, utdate, obsnum, instrume, backend, survey, project, date_obs) ' +
-                      'VALUES (%s, %s, %s, %s, %s, %s, %s, %s)',
-                      (obs['obsid'], obs['utdate'], obs['obsnum'], obs['instrume'],
-                       obs['backend'], obs['survey'], obs['project'], obs['date_obs']))
+    return dummy_database
 
 
+def populate_dummy_database(db):
+    """Insert test data into the JCMT database."""
+
     with db.db as c:
-        c.execute('ATTACH DATABASE "tmpjcmtfile.db" AS jcmt')
-
-    with open('doc/test-omp-schema.sql') as f:
-        ompschema = f.read()
-    db3 = JSAProcSQLite('tmpompfile.db', file_already_exists=False)
-    with db3.db as c:
-        c.executescript(ompschema)
-    print('attaching omp database')
-    with db.db as c:
-        c.execute('ATTACH DATABASE "tmpompfile.db" AS omp')
+        # Insert test data into database.
+        info_1 = {'obsid': '1', 'obsidss': '1-1', 'utdate': 20140101,
+                  'obsnum': 1, 'instrume': 'F', 'backend': 'B',
+                  'subsys': '1', 'survey': 'GBS', 'project': 'G01',
+                  'date_obs': datetime(2014, 1, 1, 10, 0, 0), 'filename': 'test1'}
 
+        info_2 = dict(info_1, obsidss='1-2', subsys=2, filename='test2')
+        info_3 = dict(info_1, obsid='2', obsidss='2-3', survey='DDS',
+                      project='D01', filename='test3')
+        info_4 = dict(info_1, obsid='3', obsidss='3-4', survey=None,
+                      project='XX01', filename='test4')
+        info_5 = dict(info_4, obsid='4', obsidss='4-5', project='JCMTCAL',
+                      filename='test5')
+        info_6 = dict(info_4, obsid='5', obsidss='5-6', project='CAL',
+                      filename='test6')
+        info_7 = dict(info_1, obsid='6', obsidss='6-7', project='JCMTCAL',
+                      filename='test7')
+
+        observations = (
+            info_1, info_2, info_3, info_4, info_5, info_6, info_7)
+        c.executemany(jcmt_files_insert, [
+            (obs['filename'], obs['obsid'], obs['subsys'], obs['obsidss'])
+            for obs in observations])
+        c.executemany(jcmt_common_insert, [
+            (obs['obsid'], obs['utdate'], obs['obsnum'], obs['instrume'],
+             obs['backend'], obs['survey'], obs['project'], obs['date_obs'])
+            for obs in observations])
+
+
+def clear_dummy_database(db):
+    """Delete all rows from the tables of the dummy database,
+    including the attached databases, and reset their
+    autoincrement counters."""
+
+    # The tables are cleared in the reverse of the order in which they
+    # were created, so that rows which refer to the job table are
+    # deleted before the jobs themselves.
+    with db.db as c:
+        for database in ('main', 'jcmt', 'omp'):
+            c.execute(
+                'SELECT name FROM {0}.sqlite_master '
+                "WHERE type='table' ORDER BY rowid DESC".format(database))
 
-    del(db3)
-    del(db2)
-    return db
+            for (table,) in c.fetchall():
+                c.execute('DELETE FROM {0}.{1}'.format(database, table))
 
 
 class DBTestCase(TestCase):
     """Base test case class for tests using the database.
+
+    A single in-memory SQLite database is shared by all of the tests.
+    It is cleared and the JCMT test data re-inserted before each test,
+    which is much faster than re-creating it from the schema.
     """
 
     def setUp(self):
-        """Prepare for testing by creating an in-memory
-        SQLite database from the schema file.
+        """Prepare for testing by resetting the database
+        to its initial state.
         """
 
-        self.db = create_dummy_database()
-
+        self.db = get_dummy_database()
 
+        clear_dummy_database(self.db)
+        populate_dummy_database(self.db)
 
     def tearDown(self):
-        """Disconnect from the database by deleting the
-        JSAProcDB object.
-        """
-
-
-        try:
-            os.remove('tmpjcmtfile.db')
-        except:
-            warning('Could not remove tmpjcmtfile.db')
-        try:
-            os.remove('tmpompfile.db')
-        except:
-            warning('Could not remove tmpompfile.db')
+        """Remove the test's reference to the database."""
 
         del(self.db)
-        #del self.db2
-        #del self.db3
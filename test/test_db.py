@@ -14,18 +14,21 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 from collections import OrderedDict
-from datetime import date, datetime
+from datetime import datetime
 from socket import gethostname
 from unittest import TestCase
 
 from jsa_proc.db.db import _dict_query_where_clause, Not, Fuzzy, Range, \
-        JSAProcFileInfo, JSAProcTaskInfo
+        JSAProcFileInfo, JSAProcJob, JSAProcTaskInfo
 from jsa_proc.error import JSAProcError, NoRowsError, ExcessRowsError
 from jsa_proc.jcmtobsinfo import ObsQueryDict
 from jsa_proc.state import JSAProcState
 from jsa_proc.qa_state import JSAQAState
 
-from .db import DBTestCase
+from .db import DBTestCase, jcmt_common_insert, jcmt_files_insert
+
+# Short name of this host, as should be recorded in the job logs.
+short_hostname = gethostname().partition('.')[0]
 
 
 class BasicDBTest(DBTestCase):
@@ -35,11 +38,10 @@ class BasicDBTest(DBTestCase):
         """Test that the database contains the expected tables."""
 
         with self.db.db as c:
-            tables = set()
-            for (name,) in c.execute('SELECT name FROM sqlite_master '
-                                     'WHERE type="table"'):
-                if not name.startswith('sqlite'):
-                    tables.add(name)
+            c.execute('SELECT name FROM sqlite_master '
+                      'WHERE type="table" '
+                      'AND name NOT LIKE "sqlite\\_%" ESCAPE "\\"')
+            tables = set(name for (name,) in c.fetchall())
 
         self.assertEqual(tables, set((
             'job', 'input_file', 'output_file', 'log', 'note',
@@ -104,39 +106,48 @@ class InterfaceDBTest(DBTestCase):
         job_id = self.db.add_job(tag, location, mode, parameters, 'test',
                                  input_file_names=input_file_names, priority=priority)
 
+        # Try adding a job with a state specified
+        id_2 = self.db.add_job('tag2', 'JAC', 'obs', 'REC', 'test', input_file_names=['test1'],
+                               state=JSAProcState.TRANSFERRING)
+
+        # Try adding a job with parents
+        job_id_p = self.db.add_job(tag2, location, mode, parameters, 'test',
+                                   parent_jobs=[1,2], priority=priority)
+
+        # Fetch all of the jobs together.
+        jobs = self.db.get_jobs([job_id, id_2, job_id_p, 999])
+        self.assertEqual(sorted(jobs.keys()), [job_id, id_2, job_id_p])
+        self.assertEqual(self.db.get_jobs([]), {})
+
         # Check its added correctly to job database.
-        job = self.db.get_job(id_=job_id)
-        self.assertEqual(job.state, '?')
-        self.assertEqual([job.id, job.tag, job.location, job.mode,
-                          job.parameters, job.priority, job.task],
-                         [job_id, tag, location, mode, parameters, priority,
-                          'test'])
+        self.assertEqual(
+            jobs[job_id],
+            JSAProcJob(
+                id=job_id, tag=tag, state='?', state_prev='?',
+                location=location, foreign_id=None, mode=mode,
+                parameters=parameters, priority=priority, task='test',
+                qa_state='?'))
 
         # Check that file list is added correctly.
-        files = self.db.get_input_files(job_id)
-        self.assertEqual(set(files), set(input_file_names))
+        files = self.db.get_input_files(job_id, sort=True)
+        self.assertEqual(files, sorted(input_file_names))
 
         # Check that a log entry was written.
         logs = self.db.get_logs(job_id)
         self.assertEqual(len(logs), 1)
         self.assertIn('added to the database', logs[0].message)
 
-        # Try adding a job with a state specified
-        id_2 = self.db.add_job('tag2', 'JAC', 'obs', 'REC', 'test', input_file_names=['test1'],
-                               state=JSAProcState.TRANSFERRING)
-        job2 = self.db.get_job(id_=id_2)
-        self.assertEqual(job2.state, JSAProcState.TRANSFERRING)
+        # Check the job with a state specified.
+        self.assertEqual(jobs[id_2].state, JSAProcState.TRANSFERRING)
 
-        # Try adding a job with parents
-        job_id_p = self.db.add_job(tag2, location, mode, parameters, 'test',
-                                   parent_jobs=[1,2], priority=priority)
-        # check that its added correctly to job database.
-        job = self.db.get_job(id_=job_id_p)
-        self.assertEqual(job.state, '?')
-        self.assertEqual([job.id, job.tag, job.location, job.mode,
-                          job.parameters, job.priority, job.task],
-                         [job_id_p, tag2, location, mode, parameters, priority,
-                          'test'])
+        # check that the job with parents was added correctly.
+        self.assertEqual(
+            jobs[job_id_p],
+            JSAProcJob(
+                id=job_id_p, tag=tag2, state='?', state_prev='?',
+                location=location, foreign_id=None, mode=mode,
+                parameters=parameters, priority=priority, task='test',
+                qa_state='?'))
 
         # Check can't add job with invalid state.
         with self.assertRaises(JSAProcError):
@@ -148,12 +159,15 @@ class InterfaceDBTest(DBTestCase):
                                      'a job already exists with the same tag'):
             self.db.add_job('tag2', 'JAC', 'obs', 'REC', 'test', input_file_names=['test1'])
 
-        # Check we can't give the same file more than once (a database
-        # constraint).
-        with self.assertRaises(JSAProcError):
+        # Check we can't give the same file more than once (this is
+        # checked before the job is inserted).
+        with self.assertRaisesRegexp(JSAProcError, 'more than once'):
             self.db.add_job('tag4', 'JAC', 'obs', 'REC', 'test',
                             input_file_names=['file1', 'file1'])
 
+        with self.assertRaises(NoRowsError):
+            self.db.get_job(tag='tag4')
+
         # Check that we can't add a job without either input files or parents
         with self.assertRaises(JSAProcError):
             self.db.add_job('tag4', 'JAC', 'obs', 'REC', 'test')
@@ -181,6 +195,76 @@ class InterfaceDBTest(DBTestCase):
 
         self.assertEqual(self.db.get_tilelist(job_7), set([42]))
 
+    def test_add_jobs(self):
+        """
+        Test that multiple jobs can be added to the database together.
+        """
+
+        job_ids = self.db.add_jobs([
+            dict(tag='tag1', location='JAC', mode='obs', parameters='REC',
+                 task='test', input_file_names=['test1']),
+            dict(tag='tag2', location='JAC', mode='obs', parameters='REC',
+                 task='test', input_file_names=['test2'],
+                 state=JSAProcState.QUEUED),
+        ])
+
+        self.assertEqual(job_ids, [1, 2])
+        self.assertEqual(self.db.get_job(tag='tag1').id, job_ids[0])
+        self.assertEqual(self.db.get_job(tag='tag2').state,
+                         JSAProcState.QUEUED)
+        self.assertEqual(self.db.get_input_files(job_ids[1]), ['test2'])
+
+        # If any job can not be added, none of them should be.
+        with self.assertRaises(JSAProcError):
+            self.db.add_jobs([
+                dict(tag='tag3', location='JAC', mode='obs', parameters='REC',
+                     task='test', input_file_names=['test3']),
+                dict(tag='tag1', location='JAC', mode='obs', parameters='REC',
+                     task='test', input_file_names=['test1']),
+            ])
+
+        with self.assertRaises(NoRowsError):
+            self.db.get_job(tag='tag3')
+
+        # This should also apply when an earlier job has observations.
+        with self.assertRaises(JSAProcError):
+            self.db.add_jobs([
+                dict(tag='tag3', location='JAC', mode='obs', parameters='REC',
+                     task='test', input_file_names=['test3'],
+                     obsidss=['1-1', '1-2']),
+                dict(tag='tag4', location='JAC', mode='obs', parameters='REC',
+                     task='test', input_file_names=['test4'],
+                     obsidss=['2-3']),
+                dict(tag='tag1', location='JAC', mode='obs', parameters='REC',
+                     task='test', input_file_names=['test1']),
+            ])
+
+        for tag in ('tag3', 'tag4'):
+            with self.assertRaises(NoRowsError):
+                self.db.get_job(tag=tag)
+
+        with self.db.db as c:
+            c.execute('SELECT COUNT(*) FROM obsidss')
+            self.assertEqual(c.fetchone()[0], 0)
+
+        # Check the observations are added when the jobs can be.
+        job_ids = self.db.add_jobs([
+            dict(tag='tag3', location='JAC', mode='obs', parameters='REC',
+                 task='test', input_file_names=['test3'],
+                 obsidss=['1-1', '1-2']),
+            dict(tag='tag4', location='JAC', mode='obs', parameters='REC',
+                 task='test', input_file_names=['test4'],
+                 obsidss=['2-3', 'missing']),
+        ])
+
+        with self.db.db as c:
+            c.execute('SELECT job_id, obsid_subsysnr FROM obsidss '
+                      'ORDER BY job_id, obsid_subsysnr')
+            self.assertEqual(
+                [tuple(x) for x in c.fetchall()],
+                [(job_ids[0], '1-1'), (job_ids[0], '1-2'),
+                 (job_ids[1], '2-3')])
+
     def test_change_state(self):
         """
         Change the state of a job in the database using change_state.
@@ -221,20 +305,15 @@ class InterfaceDBTest(DBTestCase):
 
         # Check log for state and messages.
         # (check both get_last_log and get_logs).
-        hostname = gethostname().partition('.')[0]
-        last_log = self.db.get_last_log(job_id)
+        logs = self.db.get_logs(job_id)
+        last_log = max(logs, key=lambda l: l.id)
         self.assertEqual([last_log.state_new, last_log.state_prev,
                           last_log.message, last_log.host, last_log.username],
-                         [newstate2, newstate, message2, hostname, 'testuser'])
-        logs = self.db.get_logs(job_id)
-        maxid = max([l.id for l in logs])
-        for l in logs:
-            if l.id == maxid:
-                self.assertEqual([l.state_new, l.state_prev, l.message,
-                                  l.host],
-                                 [newstate2, newstate, message2, hostname])
-
-        # Check two log lines were retrieved.
+                         [newstate2, newstate, message2, short_hostname,
+                          'testuser'])
+        self.assertEqual(self.db.get_last_log(job_id), last_log)
+
+        # Check three log lines were retrieved.
         self.assertEqual(len(logs), 3)
 
         # Check an error is raised if the job does not exist.
@@ -258,6 +337,49 @@ class InterfaceDBTest(DBTestCase):
         with self.assertRaises(JSAProcError):
             self.db.change_state(job_id, '!', 'test bad state')
 
+    def test_change_states(self):
+        """
+        Change the states of several jobs together using change_states.
+        """
+
+        (job_1, job_2) = self.db.add_jobs([
+            dict(tag='tag1', location='JAC', mode='obs', parameters='REC',
+                 task='test', input_file_names=['test1']),
+            dict(tag='tag2', location='JAC', mode='obs', parameters='REC',
+                 task='test', input_file_names=['test2']),
+        ])
+
+        self.db.change_states([
+            (job_1, JSAProcState.QUEUED, 'queue job 1'),
+            (job_2, JSAProcState.QUEUED, 'queue job 2'),
+            (job_1, JSAProcState.RUNNING, 'run job 1'),
+        ], username='testuser')
+
+        jobs = self.db.get_jobs([job_1, job_2])
+        self.assertEqual(
+            (jobs[job_1].state, jobs[job_1].state_prev),
+            (JSAProcState.RUNNING, JSAProcState.QUEUED))
+        self.assertEqual(
+            (jobs[job_2].state, jobs[job_2].state_prev),
+            (JSAProcState.QUEUED, JSAProcState.UNKNOWN))
+
+        last_log = self.db.get_last_log(job_1)
+        self.assertEqual(
+            (last_log.state_prev, last_log.state_new, last_log.message,
+             last_log.username),
+            (JSAProcState.QUEUED, JSAProcState.RUNNING, 'run job 1',
+             'testuser'))
+
+        # If any change fails, none should be applied.
+        with self.assertRaises(JSAProcError):
+            self.db.change_states([
+                (job_2, JSAProcState.RUNNING, 'run job 2'),
+                (job_1, '!', 'bad state'),
+            ])
+
+        self.assertEqual(self.db.get_job(id_=job_2).state,
+                         JSAProcState.QUEUED)
+
     def test_set_location_foreign_id(self):
         """
         Test setting a location and foreign id.
@@ -354,13 +476,13 @@ class InterfaceDBTest(DBTestCase):
         job_id = self.db.add_job('test_sif', 'JAC', 'obs', '', 'testtask',
                                  input_file_names=['file1', 'file2'])
 
-        files = self.db.get_input_files(job_id)
-        self.assertEqual(sorted(files), ['file1', 'file2'])
+        files = self.db.get_input_files(job_id, sort=True)
+        self.assertEqual(files, ['file1', 'file2'])
 
         self.db.set_input_files(job_id, ['file3', 'file4'])
 
-        files = self.db.get_input_files(job_id)
-        self.assertEqual(sorted(files), ['file3', 'file4'])
+        files = self.db.get_input_files(job_id, sort=True)
+        self.assertEqual(files, ['file3', 'file4'])
 
     def test_set_output_files(self):
         """
@@ -390,15 +512,15 @@ class InterfaceDBTest(DBTestCase):
         self.db.set_output_files(job_id, output_files1)
 
         # Check the values
-        out_f = self.db.get_output_files(job_id, with_info=True)
-        self.assertEqual(set(out_f), set(output_files1))
+        out_f = self.db.get_output_files(job_id, with_info=True, sort=True)
+        self.assertEqual(out_f, output_files1)
 
         # Re update to check it works when there are already files written in.
         self.db.set_output_files(job_id, output_files2)
 
         # Check new values
-        out_f = self.db.get_output_files(job_id, with_info=True)
-        self.assertEqual(set(out_f), set(output_files2))
+        out_f = self.db.get_output_files(job_id, with_info=True, sort=True)
+        self.assertEqual(out_f, output_files2)
 
     def test_output_files(self):
         """
@@ -415,62 +537,60 @@ class InterfaceDBTest(DBTestCase):
             1,
             [JSAProcFileInfo(x, None) for x in outputfiles])
 
-        addfiles = self.db.get_output_files(1)
+        addfiles = self.db.get_output_files(1, sort=True)
 
-        for i in outputfiles:
-            self.assertTrue(i in addfiles)
+        self.assertEqual(addfiles, sorted(outputfiles))
 
     def test_find_jobs(self):
         """Test the find_jobs method."""
 
         # Add some jobs.
-        job1 = self.db.add_job('tag1', 'JAC',  'obs', 'RECIPE', 'test', input_file_names=['test1'],
-                               priority=2)  # ?
-        job2 = self.db.add_job('tag2', 'JAC',  'obs', 'RECIPE', 'test2', input_file_names=['test1'],
-                               priority=4)  # Q
-        job3 = self.db.add_job('tag3', 'JAC',  'obs', 'RECIPE', 'test', input_file_names=['test1'],
-                               priority=6)  # Q
-        job4 = self.db.add_job('tag4', 'CADC', 'obs', 'RECIPE', 'test', input_file_names=['test1'],
-                               priority=5)  # Q
-        job5 = self.db.add_job('tag5', 'CADC', 'obs', 'RECIPE', 'test', input_file_names=['test1'],
-                               priority=3)  # ?
-        jobx = self.db.add_job('tagx', 'JAC',  'obs', 'RECIPE', 'test', input_file_names=['test1'],
-                               priority=3)  # X
+        (job1, job2, job3, job4, job5, jobx) = self.db.add_jobs([
+            dict(tag=tag, location=location, mode='obs',
+                 parameters='RECIPE', task=task,
+                 input_file_names=['test1'], priority=priority)
+            for (tag, location, task, priority) in (
+                ('tag1', 'JAC',  'test',  2),  # ?
+                ('tag2', 'JAC',  'test2', 4),  # Q
+                ('tag3', 'JAC',  'test',  6),  # Q
+                ('tag4', 'CADC', 'test',  5),  # Q
+                ('tag5', 'CADC', 'test',  3),  # ?
+                ('tagx', 'JAC',  'test',  3),  # X
+            )])
 
         # Put some into another state.
-        self.db.change_state(job2, 'Q', 'test')
-        self.db.change_state(job3, 'Q', 'test')
-        self.db.change_state(job4, 'Q', 'test')
-        self.db.change_state(jobx, JSAProcState.DELETED, 'delete this job')
+        self.db.change_states(
+            [(job, 'Q', 'test') for job in (job2, job3, job4)] +
+            [(jobx, JSAProcState.DELETED, 'delete this job')])
 
         # Now run some searches and check we get the right sets of jobs.
         self.assertEqual(
-            set((x.tag for x in self.db.find_jobs(state='?'))),
-            set(('tag1', 'tag5')))
+            self._find_tags(state='?', sort=True),
+            ['tag1', 'tag5'])
 
         self.assertEqual(
-            set((x.tag for x in self.db.find_jobs(state='Q'))),
-            set(('tag2', 'tag3', 'tag4')))
+            self._find_tags(state='Q', sort=True),
+            ['tag2', 'tag3', 'tag4'])
 
         self.assertEqual(
-            set((x.tag for x in self.db.find_jobs(location='JAC'))),
-            set(('tag1', 'tag2', 'tag3')))
+            self._find_tags(location='JAC', sort=True),
+            ['tag1', 'tag2', 'tag3'])
 
         self.assertEqual(
-            set((x.tag for x in self.db.find_jobs(location='CADC'))),
-            set(('tag4', 'tag5')))
+            self._find_tags(location='CADC', sort=True),
+            ['tag4', 'tag5'])
 
         self.assertEqual(
-            set((x.tag for x in self.db.find_jobs(state='Q', location='JAC'))),
-            set(('tag2', 'tag3')))
+            self._find_tags(state='Q', location='JAC', sort=True),
+            ['tag2', 'tag3'])
 
         self.assertEqual(
-            set((x.tag for x in self.db.find_jobs(JSAProcState.DELETED))),
-            set(('tagx',)))
+            self._find_tags(state=JSAProcState.DELETED, sort=True),
+            ['tagx'])
 
         self.assertEqual(
-            set((x.tag for x in self.db.find_jobs(task='test2'))),
-            set(('tag2',)))
+            self._find_tags(task='test2', sort=True),
+            ['tag2'])
 
         # Finally check a query which should get a single job and check the
         # info is good.
@@ -488,10 +608,9 @@ class InterfaceDBTest(DBTestCase):
         self.assertEqual(len(self.db.find_jobs(number=2, offset=1)), 2)
 
         # Test prioritize option.
-        self.assertEqual([x.tag for x in self.db.find_jobs(prioritize=True)],
+        self.assertEqual(self._find_tags(prioritize=True),
                          ['tag3', 'tag4', 'tag2', 'tag5', 'tag1'])
-        self.assertEqual([x.tag for x in self.db.find_jobs(number=3, offset=1,
-                                                           prioritize=True)],
+        self.assertEqual(self._find_tags(number=3, offset=1, prioritize=True),
                          ['tag4', 'tag2', 'tag5'])
 
         job6 = self.db.add_job('tag6', 'FAKELOC', 'obs', 'RECIPE', 'test', input_file_names=['test1'],
@@ -502,13 +621,29 @@ class InterfaceDBTest(DBTestCase):
                                priority=7)
 
         # Test sort option
-        self.assertEqual([x.tag for x in self.db.find_jobs(
-            prioritize=True, sort=True, location='FAKELOC')],
-            ['tag7', 'tag6', 'tag8'])
-        self.assertEqual([x.tag for x in self.db.find_jobs(sort=True)],
+        self.assertEqual(self._find_tags(prioritize=True, sort=True,
+                                         location='FAKELOC'),
+                         ['tag7', 'tag6', 'tag8'])
+        self.assertEqual(self._find_tags(sort=True),
                          ['tag1', 'tag2', 'tag3', 'tag4', 'tag5', 'tag6',
                           'tag7', 'tag8'])
 
+        # Test the fields option.
+        self.assertEqual(
+            self.db.find_jobs(location='FAKELOC', sort=True,
+                              fields=('tag', 'priority')),
+            [('tag6', 7), ('tag7', 8), ('tag8', 7)])
+
+        job = self.db.find_jobs(location='FAKELOC', sort=True,
+                                fields=('id', 'priority'))[0]
+        self.assertEqual((job.id, job.priority), (job6, 7))
+
+        with self.assertRaises(JSAProcError):
+            self.db.find_jobs(fields=('tag', 'nonexistent'))
+
+        with self.assertRaisesRegexp(JSAProcError, 'Repeated job field'):
+            self.db.find_jobs(fields=('id', 'id'))
+
         # Test the return preview files option..
         outfiles = ['1.sdf', '2.sdf', 'name_preview_64.png']
         self.db.set_output_files(1,
@@ -534,20 +669,21 @@ class InterfaceDBTest(DBTestCase):
         with self.assertRaises(NoRowsError):
             self.db.get_parents(1)
 
-        # Add 2 jobs to the data base.
-        jobid = self.db.add_job('tag1', 'FAKELOC', 'obs', 'RECIPE', 'test',
-                                input_file_names=['test1','test2'],
-                               priority=7)
-        jobid2 = self.db.add_job('tag2', 'FAKELOC', 'obs', 'RECIPE', 'test',
-                                 input_file_names=['test3','test4'],
-                               priority=7)
-        # Add a job that depends on this one
-        jobid3 = self.db.add_job('tag3', 'FAKELOC', 'obs', 'RECIPE', 'test',
-                                 parent_jobs=[1,2], filters=['850um', '850um'],
-                               priority=7)
+        # Add 2 jobs to the data base, and a job that depends on them.
+        (jobid, jobid2, jobid3) = self.db.add_jobs([
+            dict(tag='tag1', location='FAKELOC', mode='obs',
+                 parameters='RECIPE', task='test',
+                 input_file_names=['test1', 'test2'], priority=7),
+            dict(tag='tag2', location='FAKELOC', mode='obs',
+                 parameters='RECIPE', task='test',
+                 input_file_names=['test3', 'test4'], priority=7),
+            dict(tag='tag3', location='FAKELOC', mode='obs',
+                 parameters='RECIPE', task='test',
+                 parent_jobs=[1, 2], filters=['850um', '850um'], priority=7),
+        ])
         # Check you get back the right values
-        self.assertEqual(set([(1, '850um'), (2, '850um')]),
-                         set(self.db.get_parents(jobid3)))
+        self.assertEqual([(1, '850um'), (2, '850um')],
+                         sorted(self.db.get_parents(jobid3)))
 
         # Check you can recover the other way
         self.assertEqual([jobid3], self.db.get_children(jobid))
@@ -564,8 +700,8 @@ class InterfaceDBTest(DBTestCase):
 
         # Test that you can delete a single parent job.
         self.db.delete_some_parents(jobid3, [1])
-        self.assertEqual(set([(2, '850um')]),
-                         set(self.db.get_parents(jobid3)))
+        self.assertEqual([(2, '850um')],
+                         sorted(self.db.get_parents(jobid3)))
 
         # Test that you can't delete a parent that doesn't exist
         with self.assertRaises(JSAProcError):
@@ -573,8 +709,8 @@ class InterfaceDBTest(DBTestCase):
 
         # Test that you can add a single job.
         self.db.add_to_parents(jobid3, [jobid], filters='450um')
-        self.assertEqual(set([(1, '450um'), (2, '850um')]),
-                         set(self.db.get_parents(jobid3)))
+        self.assertEqual([(1, '450um'), (2, '850um')],
+                         sorted(self.db.get_parents(jobid3)))
         # Test that you can delete all parents
         self.db.delete_parents(jobid3)
         with self.assertRaises(NoRowsError):
@@ -587,101 +723,28 @@ class InterfaceDBTest(DBTestCase):
 
     def test_find_jobs_obsquery(self):
 
-        info_1 = {'obsid': '1', 'obsidss': '1-1', 'utdate': 20140101,
-                  'obsnum': 1, 'instrume': 'F', 'backend': 'B',
-                  'subsys': 1, 'survey': 'GBS', 'project': 'G01',
-                  'date_obs': datetime(2014, 1, 1, 10, 0, 0)}
-
-
-
-        info_2 = info_1.copy()
-        info_2.update(obsidss='1-2', subsys=2)
-
-        info_3 = info_1.copy()
-        info_3.update(obsid='2', obsidss='2-3', survey='DDS', project='D01')
-
-        job_1 = self.db.add_job('tag1', 'JAC', 'obs', 'RECIPE', 'test', input_file_names=['test1'],
-                                obsidss=[info_1['obsidss']])
-        job_2 = self.db.add_job('tag2', 'JAC', 'obs', 'RECIPE', 'test', input_file_names=['test2'],
-                                obsidss=[info_2['obsidss']])
-        job_3 = self.db.add_job('tag3', 'JAC', 'obs', 'RECIPE', 'test', input_file_names=['test1', 'test2'],
-                                obsidss=[info_1['obsidss'], info_2['obsidss']])
-        job_4 = self.db.add_job('tag4', 'JAC', 'obs', 'RECIPE', 'test', input_file_names=['test3'],
-                                obsidss=[info_3['obsidss']])
-        job_5 = self.db.add_job('tag5', 'JAC', 'obs', 'RECIPE', 'test', input_file_names=['test2', 'test3'],
-                                obsidss=[info_2['obsidss'], info_3['obsidss']])
-
-        info_4 = info_1.copy()
-        info_4.update(obsid='3', obsidss='3-4',survey=None, project='XX01')
-
-        info_5 = info_4.copy()
-        info_5.update(obsid='4', obsidss='4-5',project='JCMTCAL')
-
-        info_6 = info_4.copy()
-        info_6.update(obsid= '5', obsidss='5-6', project='CAL')
-
-        job_6 = self.db.add_job('tag6', 'JAC', 'obs', 'RECIPE', 'test', input_file_names=['test4'],
-                                obsidss=[info_4['obsidss']])
-        job_7 = self.db.add_job('tag7', 'JAC', 'obs', 'RECIPE', 'test', input_file_names=['test5'],
-                                obsidss=[info_5['obsidss']])
-        job_8 = self.db.add_job('tag8', 'JAC', 'obs', 'RECIPE', 'test', input_file_names=['test6'],
-                                obsidss=[info_6['obsidss']])
-
-        info_7 = info_1.copy()
-        info_7.update(obsid= '6', obsidss='6-7', project='JCMTCAL')
-
-        job_9 = self.db.add_job('tag9', 'JAC', 'obs', 'RECIPE', 'test', input_file_names=['test7'],
-                                obsidss=[info_7['obsidss']])
-
-        queries = [
-            (
-                ObsQueryDict['Surveys']['GBS'].where,
-                (job_1, job_2, job_3, job_5, job_9),
-            ),
-            (
-                ObsQueryDict['Surveys']['DDS'].where,
-                (job_4, job_5),
-            ),
-            (
-                ObsQueryDict['Surveys']['NoSurvey'].where,
-                (job_6, job_7, job_8),
-            ),
-            (
-                ObsQueryDict['CalTypes']['Calibrations'].where,
-                (job_7, job_8, job_9),
-            ),
-            (
-                ObsQueryDict['CalTypes']['NoCalibrations'].where,
-                (job_1, job_2, job_3, job_4, job_5, job_6),
-            ),
-            (
-                d_add(ObsQueryDict['Surveys']['GBS'].where,
-                      ObsQueryDict['CalTypes']['Calibrations'].where),
-                (job_9,),
-            ),
-            (
-                d_add(ObsQueryDict['Surveys']['GBS'].where,
-                      ObsQueryDict['CalTypes']['NoCalibrations'].where),
-                (job_1, job_2, job_3, job_5),
-            ),
-            (
-                d_add(ObsQueryDict['Surveys']['NoSurvey'].where,
-                      ObsQueryDict['CalTypes']['Calibrations'].where),
-                (job_7, job_8),
-            ),
-            (
-                d_add(ObsQueryDict['Surveys']['NoSurvey'].where,
-                      ObsQueryDict['CalTypes']['NoCalibrations'].where),
-                (job_6,),
-            ),
-        ]
-
-        for (oq, expect) in queries:
+        # Add jobs for the observations in the test JCMT database
+        # (see populate_dummy_database).
+        self.db.add_jobs([
+            dict(tag=tag, location='JAC', mode='obs', parameters='RECIPE',
+                 task='test', input_file_names=input_file_names,
+                 obsidss=obsidss)
+            for (tag, input_file_names, obsidss) in (
+                ('tag1', ['test1'], ['1-1']),
+                ('tag2', ['test2'], ['1-2']),
+                ('tag3', ['test1', 'test2'], ['1-1', '1-2']),
+                ('tag4', ['test3'], ['2-3']),
+                ('tag5', ['test2', 'test3'], ['1-2', '2-3']),
+                ('tag6', ['test4'], ['3-4']),
+                ('tag7', ['test5'], ['4-5']),
+                ('tag8', ['test6'], ['5-6']),
+                ('tag9', ['test7'], ['6-7']),
+            )])
+
+        for (oq, expect) in obsquery_cases:
             try:
-                results = set(x.id for x in self.db.find_jobs(obsquery=oq))
-                self.assertEqual(
-                    results,
-                    set(expect))
+                results = self._find_tags(obsquery=oq, sort=True)
+                self.assertEqual(results, list(expect))
             except:
                 print(oq, expect, results)
                 raise
@@ -694,8 +757,10 @@ class InterfaceDBTest(DBTestCase):
     def test_processing_time(self):
         job_id = self.db.add_job('tag1', 'JAC', 'obs', 'RECIPE', 'test', input_file_names=['test1'])
 
-        self.db.change_state(job_id, JSAProcState.RUNNING, 'start')
-        self.db.change_state(job_id, JSAProcState.PROCESSED, 'end')
+        self.db.change_states([
+            (job_id, JSAProcState.RUNNING, 'start'),
+            (job_id, JSAProcState.PROCESSED, 'end'),
+        ])
 
         # Check that we find this job:
         (ids, duration, obsinfo) = self.db.get_processing_time_obs_type()
@@ -718,12 +783,11 @@ class InterfaceDBTest(DBTestCase):
         job_2 = self.db.add_job('tag2', 'JAC', 'obs', 'RECIPE', 'test', input_file_names=['test1'])
         job_3 = self.db.add_job('tag3', 'JAC', 'obs', 'RECIPE', 'test', input_file_names=['test1'])
         job_4 = self.db.add_job('tag4', 'JAC', 'obs', 'RECIPE', 'test', input_file_names=['test1'])
-        self.db.change_state(job_2, JSAProcState.RUNNING, 'start')
-        self.db.change_state(job_3, JSAProcState.RUNNING, 'start')
-        self.db.change_state(job_4, JSAProcState.RUNNING, 'start')
-        self.db.change_state(job_2, JSAProcState.PROCESSED, 'end')
-        self.db.change_state(job_3, JSAProcState.PROCESSED, 'end')
-        self.db.change_state(job_4, JSAProcState.PROCESSED, 'end')
+        self.db.change_states(
+            [(job, JSAProcState.RUNNING, 'start')
+             for job in (job_2, job_3, job_4)] +
+            [(job, JSAProcState.PROCESSED, 'end')
+             for job in (job_2, job_3, job_4)])
 
         self.assertEqual(len(self.db.get_processing_time_obs_type(
             jobdict={'tag': 'tag3'})[0]),
@@ -741,38 +805,7 @@ class InterfaceDBTest(DBTestCase):
                          command_run='custom_run_command',
                          command_xfer='custom_xfer_command',
                          command_ingest='custom_ingest_command')
-        self.assertEqual(self.db.get_task_info('testtask').starlink_dir,
-                         'mystarpath')
-        self.assertTrue(self.db.get_task_info('testtask').etransfer)
-        self.assertIsNone(self.db.get_task_info('testtask').version)
-        self.assertIsNone(self.db.get_task_info('testtask').raw_output)
-        self.assertIsNone(self.db.get_task_info('testtask2').starlink_dir)
-        self.assertFalse(self.db.get_task_info('testtask2').etransfer)
-        self.assertIsNone(self.db.get_task_info('testtask2').version)
-        self.assertTrue(self.db.get_task_info('testtask2').raw_output)
-        self.assertIsNone(self.db.get_task_info('testtask3').etransfer)
-        self.assertFalse(self.db.get_task_info('testtask3').raw_output)
-        self.assertEqual(self.db.get_task_info('testtask3').starlink_dir,
-                         'mystarpath')
-        self.assertEqual(self.db.get_task_info('testtask3').version, 1)
-        self.assertIsNone(self.db.get_task_info('testtask3').command_run)
-        self.assertIsNone(self.db.get_task_info('testtask3').command_xfer)
-        self.assertIsNone(self.db.get_task_info('testtask3').command_ingest)
-        self.assertIsNone(self.db.get_task_info('testtask4').etransfer)
-        self.assertEqual(self.db.get_task_info('testtask4').starlink_dir,
-                         'myotherstarpath')
-        self.assertEqual(self.db.get_task_info('testtask4').version, 2)
-        self.assertEqual(self.db.get_task_info('testtask4').command_run,
-                         'custom_run_command')
-        self.assertEqual(self.db.get_task_info('testtask4').command_xfer,
-                         'custom_xfer_command')
-        self.assertEqual(self.db.get_task_info('testtask4').command_ingest,
-                         'custom_ingest_command')
-
-        with self.assertRaises(NoRowsError):
-            self.db.get_task_info('notatask')
-
-        # Try getting info for all tasks at once: should get a dictionary
+        # Get info for all tasks at once: should get a dictionary
         # containing sensible entries, one for each task.
         result = self.db.get_task_info()
         self.assertIsInstance(result, dict)
@@ -785,6 +818,19 @@ class InterfaceDBTest(DBTestCase):
             self.assertIsInstance(task_info.id, int)
             self.assertEqual(task_info.taskname, task)
 
+        for (task, expected) in task_info_cases:
+            task_info = result[task]
+            for (field, value) in expected:
+                self.assertEqual(getattr(task_info, field), value,
+                                 'task {0} {1}'.format(task, field))
+
+        # Getting a single task should give the same information.
+        self.assertEqual(self.db.get_task_info('testtask4'),
+                         result['testtask4'])
+
+        with self.assertRaises(NoRowsError):
+            self.db.get_task_info('notatask')
+
     def test_tilelist(self):
         job_id = self.db.add_job('tag1', 'JAC', 'obs', 'RECIPE', 'test', input_file_names=['test1'])
 
@@ -792,14 +838,14 @@ class InterfaceDBTest(DBTestCase):
         self.assertEqual(self.db.get_tilelist(job_id), set([]))
 
         # Add tiles
-        tiles = set((42, 43, 44))
+        tiles = {42, 43, 44}
         self.db.set_tilelist(job_id, tiles)
-        self.assertEqual(set(self.db.get_tilelist(job_id)), set(tiles))
+        self.assertEqual(self.db.get_tilelist(job_id), tiles)
 
         # Change tiles
-        newtiles = set((45, 46, 47))
+        newtiles = {45, 46, 47}
         self.db.set_tilelist(job_id, newtiles)
-        self.assertEqual(set(self.db.get_tilelist(job_id)), set(newtiles))
+        self.assertEqual(self.db.get_tilelist(job_id), newtiles)
 
     def test_get_tasks(self):
         with self.assertRaises(NoRowsError):
@@ -811,8 +857,12 @@ class InterfaceDBTest(DBTestCase):
         self.assertEqual(self.db.get_tasks(), ['test1', 'test2'])
 
     def test_qa(self):
-        self.db.add_job('tag1', 'JAC', 'obs', 'REC', 'test1', input_file_names=['test1'])
-        self.db.add_job('tag2', 'JAC', 'obs', 'REC', 'test2', input_file_names=['test1'])
+        self.db.add_jobs([
+            dict(tag='tag1', location='JAC', mode='obs', parameters='REC',
+                 task='test1', input_file_names=['test1']),
+            dict(tag='tag2', location='JAC', mode='obs', parameters='REC',
+                 task='test2', input_file_names=['test1']),
+        ])
         self.db.add_qa_entry(1, 'B', 'Testing qa entry', 'testUser')
         self.db.add_qa_entry(1, 'G', 'Testing qa entry', 'testUser')
         self.db.add_qa_entry(1, 'Q', 'Testing qa entry', 'testUser')
@@ -831,20 +881,14 @@ class InterfaceDBTest(DBTestCase):
             self.db.get_date_range()
 
         job_1 = self.db.add_job('tag1', 'JAC',  'obs', 'RECIPE', 'test', input_file_names=['test1'])
-        info = {'obsid': 'x14_01_1T1', 'obsidss': 'x14_1_1T1_850',
-                'utdate': 20140101, 'obsnum': 3,
-                'instrument': 'SCUBA-2',
-                'backend': 'ACSIS', 'subsys': '1',
-                'date_obs': datetime(2014, 1, 1, 9, 0, 0)}
-        with self.db.db as c:
-            c.execute('INSERT INTO jcmt.FILES (file_id, obsid, subsysnr, nsubscan, obsid_subsysnr) ' +
-                      'VALUES ("testfile.sdf", %s, %s, 100, %s)',
-                      (info['obsid'], info['subsys'], info['obsidss']))
-            c.execute('INSERT INTO jcmt.COMMON (obsid, utdate, obsnum, instrume, backend, date_obs) ' +
-                      'VALUES (%s, %s, %s, %s, %s, %s)',
-                      (info['obsid'], info['utdate'], info['obsnum'], info['instrument'],
-                       info['backend'], info['date_obs']))
+        info = make_obs('x14_01_1T1', 'x14_1_1T1_850', datetime(2014, 1, 1, 9, 0, 0))
+        info2 = make_obs('ax14_01_1T1', 'ax14_1_1T1_850', datetime(2014, 5, 1, 9, 0, 0))
+        info3 = make_obs('bx14_01_1T1', 'bx14_1_1T1_850', datetime(2013, 5, 1, 9, 0, 0))
+        info4 = make_obs('cx14_01_1T1', 'cx14_1_1T1_850', datetime(2013, 1, 1, 9, 0, 0))
 
+        # Observations only affect the date range once they are
+        # associated with a job, so they can all be inserted at once.
+        insert_obs(self.db, (info, info2, info3, info4))
 
         self.db.set_obsidss(job_1, [info['obsidss']])
 
@@ -852,52 +896,12 @@ class InterfaceDBTest(DBTestCase):
 
         self.assertEqual((info['utdate'], info['utdate']), self.db.get_date_range(task='test'))
 
-        info2 = {'obsid': 'ax14_01_1T1', 'obsidss': 'ax14_1_1T1_850',
-                'utdate': 20140501, 'obsnum': 3,
-                'instrument': 'SCUBA-2',
-                'backend': 'ACSIS', 'subsys': '1',
-                'date_obs': datetime(2014, 5, 1, 9, 0, 0)}
-        with self.db.db as c:
-            c.execute('INSERT INTO jcmt.FILES (file_id, obsid, subsysnr, nsubscan, obsid_subsysnr) ' +
-                      'VALUES ("testfile.sdf", %s, %s, 100, %s)',
-                      (info2['obsid'], info2['subsys'], info2['obsidss']))
-            c.execute('INSERT INTO jcmt.COMMON (obsid, utdate, obsnum, instrume, backend, date_obs) ' +
-                      'VALUES (%s, %s, %s, %s, %s, %s)',
-                      (info2['obsid'], info2['utdate'], info2['obsnum'], info2['instrument'],
-                       info2['backend'], info2['date_obs']))
-        self.db.set_obsidss(job_1, [info['obsidss'], info2['obsidss']])
+        self.db.set_obsidss(job_1, [info2['obsidss']], replace_all=False)
 
         self.assertEqual((info['utdate'], info2['utdate']), self.db.get_date_range())
         self.assertEqual((info['utdate'], info2['utdate']), self.db.get_date_range(task='test'))
         job_2 = self.db.add_job('tag2', 'JAC',  'obs', 'RECIPE', 'test2', input_file_names=['test1'])
 
-        info3 = {'obsid': 'bx14_01_1T1', 'obsidss': 'bx14_1_1T1_850',
-                 'utdate': 20130501, 'obsnum': 3,
-                 'instrument': 'SCUBA-2',
-                 'backend': 'ACSIS', 'subsys': '1',
-                 'date_obs': datetime(2013, 5, 1, 9, 0, 0)}
-        with self.db.db as c:
-            c.execute('INSERT INTO jcmt.FILES (file_id, obsid, subsysnr, nsubscan, obsid_subsysnr) ' +
-                      'VALUES ("testfile.sdf", %s, %s, 100, %s)',
-                      (info3['obsid'], info3['subsys'], info3['obsidss']))
-            c.execute('INSERT INTO jcmt.COMMON (obsid, utdate, obsnum, instrume, backend, date_obs) ' +
-                      'VALUES (%s, %s, %s, %s, %s, %s)',
-                      (info3['obsid'], info3['utdate'], info3['obsnum'], info3['instrument'],
-                       info3['backend'], info3['date_obs']))
-
-        info4 = {'obsid': 'cx14_01_1T1', 'obsidss': 'cx14_1_1T1_850',
-                'utdate': 20130101, 'obsnum': 3,
-                'instrument': 'SCUBA-2',
-                'backend': 'ACSIS', 'subsys': '1',
-                'date_obs': datetime(2013, 1, 1, 9, 0, 0)}
-        with self.db.db as c:
-            c.execute('INSERT INTO jcmt.FILES (file_id, obsid, subsysnr, nsubscan, obsid_subsysnr) ' +
-                      'VALUES ("testfile.sdf", %s, %s, 100, %s)',
-                      (info4['obsid'], info4['subsys'], info4['obsidss']))
-            c.execute('INSERT INTO jcmt.COMMON (obsid, utdate, obsnum, instrume, backend, date_obs) ' +
-                      'VALUES (%s, %s, %s, %s, %s, %s)',
-                      (info4['obsid'], info4['utdate'], info4['obsnum'], info4['instrument'],
-                       info4['backend'], info4['date_obs']))
         self.db.set_obsidss(job_2, [info3['obsidss'], info4['obsidss']])
         self.assertEqual((info4['utdate'], info2['utdate']), self.db.get_date_range())
         self.assertEqual((info4['utdate'], info3['utdate']), self.db.get_date_range(task='test2'))
@@ -907,49 +911,51 @@ class InterfaceDBTest(DBTestCase):
         """
         Check the db.find_errors_logs function
         """
-        job_1 = self.db.add_job('tag1', 'JAC',  'obs', 'RECIPE', 'test', input_file_names=['test1'])
-        job_2 = self.db.add_job('tag2', 'CANFAR',  'obs', 'RECIPE', 'test1', input_file_names=['test1'])
+        (job_1, job_2) = self.db.add_jobs([
+            dict(tag='tag1', location='JAC', mode='obs', parameters='RECIPE',
+                 task='test', input_file_names=['test1']),
+            dict(tag='tag2', location='CANFAR', mode='obs',
+                 parameters='RECIPE', task='test1', input_file_names=['test1']),
+        ])
         # Values to change to.
         newstate = JSAProcState.RUNNING
         message = 'Changed state of job %s to S' % (job_1)
         newstate2 = JSAProcState.ERROR
         message2 = 'Changed state of job %s to %s' % (job_1, newstate2)
-        self.db.change_state(job_1, newstate, message)
-        self.db.change_state(job_1, newstate2, message2)
         newstate3 = JSAProcState.QUEUED
         message3 = 'Changed state of job %s to S' % (job_2)
         newstate4 = JSAProcState.ERROR
         message4 = 'Changed state of job %s to %s' % (job_2, newstate4)
-        self.db.change_state(job_2, newstate3, message3)
-        self.db.change_state(job_2, newstate4, message4)
+        self.db.change_states([
+            (job_1, newstate, message),
+            (job_1, newstate2, message2),
+            (job_2, newstate3, message3),
+            (job_2, newstate4, message4),
+        ])
 
         elog_all = self.db.find_errors_logs()
         ej1 = elog_all[job_1]
-        self.assertEqual((ej1[1].message, ej1[1].state, ej1[1].location, ej1[1].id),
-                         (message, newstate, 'JAC', job_1))
-        self.assertEqual((ej1[0].message, ej1[0].state, ej1[0].location, ej1[0].id),
-                         (message2, newstate2, 'JAC', job_1))
+        self.assertEqual([error_info_summary(x) for x in ej1[:2]],
+                         [(message2, newstate2, 'JAC', job_1),
+                          (message, newstate, 'JAC', job_1)])
         ej2 = elog_all[job_2]
-        self.assertEqual((ej2[1].message, ej2[1].state, ej2[1].location, ej2[1].id),
-                         (message3, newstate3, 'CANFAR', job_2))
-        self.assertEqual((ej2[0].message, ej2[0].state, ej2[0].location, ej2[0].id),
-                         (message4, newstate4, 'CANFAR', job_2))
+        self.assertEqual([error_info_summary(x) for x in ej2[:2]],
+                         [(message4, newstate4, 'CANFAR', job_2),
+                          (message3, newstate3, 'CANFAR', job_2)])
 
         elog_canfar = self.db.find_errors_logs(location='CANFAR')
         ej2 = elog_canfar[job_2]
-        self.assertEqual((ej2[1].message, ej2[1].state, ej2[1].location, ej2[1].id),
-                         (message3, newstate3, 'CANFAR', job_2))
-        self.assertEqual((ej2[0].message, ej2[0].state, ej2[0].location, ej2[0].id),
-                         (message4, newstate4, 'CANFAR', job_2))
+        self.assertEqual([error_info_summary(x) for x in ej2[:2]],
+                         [(message4, newstate4, 'CANFAR', job_2),
+                          (message3, newstate3, 'CANFAR', job_2)])
         with self.assertRaises(KeyError):
             ej1 = elog_canfar[job_1]
 
         elog_test1 = self.db.find_errors_logs(task='test1')
         ej2 = elog_test1[job_2]
-        self.assertEqual((ej2[1].message, ej2[1].state, ej2[1].location, ej2[1].id),
-                         (message3, newstate3, 'CANFAR', job_2))
-        self.assertEqual((ej2[0].message, ej2[0].state, ej2[0].location, ej2[0].id),
-                         (message4, newstate4, 'CANFAR', job_2))
+        self.assertEqual([error_info_summary(x) for x in ej2[:2]],
+                         [(message4, newstate4, 'CANFAR', job_2),
+                          (message3, newstate3, 'CANFAR', job_2)])
         with self.assertRaises(KeyError):
             ej1 = elog_test1[job_1]
 
@@ -983,85 +989,252 @@ class InterfaceDBTest(DBTestCase):
         self.assertIsNone(self.db.get_obs_preproc_recipe(
             'acsis_99999_20191222T145926'))
 
+    def _find_tags(self, **kwargs):
+        """
+        Private method to find jobs, returning a list of their tags.
+        """
+
+        return [x.tag for x in self.db.find_jobs(fields=('tag',), **kwargs)]
+
 
 class DBUtilityTestCase(TestCase):
-    def test_dict_query(self):
+    def test_dict_query_invalid(self):
         with self.assertRaises(JSAProcError):
             _dict_query_where_clause('x;y', {'col': 'val'})
 
         with self.assertRaises(JSAProcError):
             _dict_query_where_clause('xyz', {'c;l': 'val'})
 
-        queries = [
-            (
-                ('tab', OrderedDict()),
-                ('', [])
-            ),
-            (
-                ('tab', OrderedDict([('a', 'x'), ('b', 'y')])),
-                ('(tab.`a`=%s AND tab.`b`=%s)', ['x', 'y'])
-            ),
-            (
-                ('tab', OrderedDict([('a', 'x'), ('b', 'y')]), True),
-                ('(tab.`a`=%s OR tab.`b`=%s)', ['x', 'y'])
-            ),
-            (
-                ('tab', OrderedDict([('q', ['i', 'j'])])),
-                ('(tab.`q` IN (%s, %s))', ['i', 'j'])
-            ),
-            (
-                ('tab', OrderedDict([('q', Not(['i', 'j']))])),
-                ('((tab.`q` NOT IN (%s, %s) OR tab.`q` IS NULL))', ['i', 'j'])
-            ),
-            (
-                ('tab', OrderedDict([('z', Not('q'))])),
-                ('((tab.`z`<>%s OR tab.`z` IS NULL))', ['q'])
-            ),
-            (
-                ('tab', OrderedDict([('n', None)])),
-                ('(tab.`n` IS NULL)', [])
-            ),
-            (
-                ('tab', OrderedDict([('nn', Not(None))])),
-                ('(tab.`nn` IS NOT NULL)', [])
-            ),
-            (
-                ('tab', {'f': Fuzzy('x')}),
-                ('(tab.`f` LIKE %s)', ['%x%'])
-            ),
-            (
-                ('tab', {'f': Not(Fuzzy('x'))}),
-                ('((tab.`f` NOT LIKE %s OR tab.`f` IS NULL))', ['%x%'])
-            ),
-            (
-                ('tab', {'d': Range(28, 82)}),
-                ('(tab.`d` BETWEEN %s AND %s)', [28, 82])
-            ),
-            (
-                ('tab', {'d': Not(Range(28, 82))}),
-                ('(tab.`d` NOT BETWEEN %s AND %s)', [28, 82])
-            ),
-            (
-                ('tab', {'d': Range(28, None)}),
-                ('(tab.`d` >= %s)', [28])
-            ),
-            (
-                ('tab', {'d': Range(None, 82)}),
-                ('(tab.`d` <= %s)', [82])
-            ),
-            (
-                ('tab', {'d': Not(Range(28, None))}),
-                ('(tab.`d` < %s)', [28])
-            ),
-            (
-                ('tab', {'d': Not(Range(None, 82))}),
-                ('(tab.`d` > %s)', [82])
-            ),
-        ]
-
-        for (query, expect) in queries:
-            self.assertEqual(_dict_query_where_clause(*query), expect)
+    def test_dict_query(self):
+        for (query, expect) in dict_query_cases:
+            self.assertEqual(_dict_query_where_clause(*query), expect,
+                             'query: {0!r}'.format(query))
+
+    def test_dict_query_cache(self):
+        # Queries of the same shape should give the same SQL (retrieved
+        # from the cache) with the new parameters.
+        self.assertEqual(
+            _dict_query_where_clause('tab', {'q': ['i', 'j']}),
+            ('(tab.`q` IN (%s, %s))', ['i', 'j']))
+
+        self.assertEqual(
+            _dict_query_where_clause('tab', {'q': ['k', 'l']}),
+            ('(tab.`q` IN (%s, %s))', ['k', 'l']))
+
+        # The cached SQL should have placeholders for the number of values.
+        self.assertEqual(
+            _dict_query_where_clause('tab', {'q': ['i', 'j', 'k']}),
+            ('(tab.`q` IN (%s, %s, %s))', ['i', 'j', 'k']))
+
+        self.assertEqual(
+            _dict_query_where_clause(
+                'tab', OrderedDict((('q', ['i']), ('r', Not(['j', 'k']))))),
+            ('(tab.`q` IN (%s) AND (tab.`r` NOT IN (%s, %s) '
+             'OR tab.`r` IS NULL))', ['i', 'j', 'k']))
+
+        # Changes in shape should not use the cached SQL.
+
+        self.assertEqual(
+            _dict_query_where_clause('tab', {'q': Not(['i', 'j'])}),
+            ('((tab.`q` NOT IN (%s, %s) OR tab.`q` IS NULL))', ['i', 'j']))
+
+        self.assertEqual(
+            _dict_query_where_clause('tab', {'d': Range(None, 82)}),
+            ('(tab.`d` <= %s)', [82]))
+
+        self.assertEqual(
+            _dict_query_where_clause('tab', {'d': Range(28, None)}),
+            ('(tab.`d` >= %s)', [28]))
+
+        # Invalid names must still be rejected.
+        with self.assertRaises(JSAProcError):
+            _dict_query_where_clause('tab', {'q;': ['i', 'j']})
+
+
+# Common values for observations added by make_obs.
+obs_base = {
+    'obsnum': 3, 'instrument': 'SCUBA-2', 'backend': 'ACSIS', 'subsys': '1',
+}
+
+
+def make_obs(obsid, obsidss, date_obs):
+    """Create a dictionary of test observation information."""
+
+    return dict(obs_base, obsid=obsid, obsidss=obsidss,
+                utdate=int(date_obs.strftime('%Y%m%d')), date_obs=date_obs)
+
+
+def insert_obs(db, observations):
+    """Insert observations created by make_obs into the JCMT tables."""
+
+    with db.db as c:
+        c.executemany(jcmt_files_insert, [
+            ('testfile.sdf', obs['obsid'], obs['subsys'], obs['obsidss'])
+            for obs in observations])
+        c.executemany(jcmt_common_insert, [
+            (obs['obsid'], obs['utdate'], obs['obsnum'], obs['instrument'],
+             obs['backend'], None, None, obs['date_obs'])
+            for obs in observations])
+
+
+def error_info_summary(info):
+    """Extract the values to be checked from a JSAProcErrorInfo tuple."""
+
+    return (info.message, info.state, info.location, info.id)
 
 
 def d_add(*args):
-    return dict(sum((list(d.items()) for d in args), []))
+    result = {}
+    for d in args:
+        result.update(d)
+    return result
+
+
+# Expected attribute values for the tasks added by test_taskinfo.
+task_info_cases = [
+    ('testtask', [
+        ('starlink_dir', 'mystarpath'),
+        ('etransfer', True),
+        ('version', None),
+        ('raw_output', None),
+    ]),
+    ('testtask2', [
+        ('starlink_dir', None),
+        ('etransfer', False),
+        ('version', None),
+        ('raw_output', True),
+    ]),
+    ('testtask3', [
+        ('etransfer', None),
+        ('raw_output', False),
+        ('starlink_dir', 'mystarpath'),
+        ('version', 1),
+        ('command_run', None),
+        ('command_xfer', None),
+        ('command_ingest', None),
+    ]),
+    ('testtask4', [
+        ('etransfer', None),
+        ('starlink_dir', 'myotherstarpath'),
+        ('version', 2),
+        ('command_run', 'custom_run_command'),
+        ('command_xfer', 'custom_xfer_command'),
+        ('command_ingest', 'custom_ingest_command'),
+    ]),
+]
+
+
+# Observation queries for test_find_jobs_obsquery, with the tags
+# of the jobs which they are expected to find.
+obsquery_cases = [
+    (
+        ObsQueryDict['Surveys']['GBS'].where,
+        ('tag1', 'tag2', 'tag3', 'tag5', 'tag9'),
+    ),
+    (
+        ObsQueryDict['Surveys']['DDS'].where,
+        ('tag4', 'tag5'),
+    ),
+    (
+        ObsQueryDict['Surveys']['NoSurvey'].where,
+        ('tag6', 'tag7', 'tag8'),
+    ),
+    (
+        ObsQueryDict['CalTypes']['Calibrations'].where,
+        ('tag7', 'tag8', 'tag9'),
+    ),
+    (
+        ObsQueryDict['CalTypes']['NoCalibrations'].where,
+        ('tag1', 'tag2', 'tag3', 'tag4', 'tag5', 'tag6'),
+    ),
+    (
+        d_add(ObsQueryDict['Surveys']['GBS'].where,
+              ObsQueryDict['CalTypes']['Calibrations'].where),
+        ('tag9',),
+    ),
+    (
+        d_add(ObsQueryDict['Surveys']['GBS'].where,
+              ObsQueryDict['CalTypes']['NoCalibrations'].where),
+        ('tag1', 'tag2', 'tag3', 'tag5'),
+    ),
+    (
+        d_add(ObsQueryDict['Surveys']['NoSurvey'].where,
+              ObsQueryDict['CalTypes']['Calibrations'].where),
+        ('tag7', 'tag8'),
+    ),
+    (
+        d_add(ObsQueryDict['Surveys']['NoSurvey'].where,
+              ObsQueryDict['CalTypes']['NoCalibrations'].where),
+        ('tag6',),
+    ),
+]
+
+
+# Arguments for _dict_query_where_clause used by test_dict_query,
+# with the expected result.
+dict_query_cases = [
+    (
+        ('tab', {}),
+        ('', [])
+    ),
+    (
+        ('tab', OrderedDict([('a', 'x'), ('b', 'y')])),
+        ('(tab.`a`=%s AND tab.`b`=%s)', ['x', 'y'])
+    ),
+    (
+        ('tab', OrderedDict([('a', 'x'), ('b', 'y')]), True),
+        ('(tab.`a`=%s OR tab.`b`=%s)', ['x', 'y'])
+    ),
+    (
+        ('tab', {'q': ['i', 'j']}),
+        ('(tab.`q` IN (%s, %s))', ['i', 'j'])
+    ),
+    (
+        ('tab', {'q': Not(['i', 'j'])}),
+        ('((tab.`q` NOT IN (%s, %s) OR tab.`q` IS NULL))', ['i', 'j'])
+    ),
+    (
+        ('tab', {'z': Not('q')}),
+        ('((tab.`z`<>%s OR tab.`z` IS NULL))', ['q'])
+    ),
+    (
+        ('tab', {'n': None}),
+        ('(tab.`n` IS NULL)', [])
+    ),
+    (
+        ('tab', {'nn': Not(None)}),
+        ('(tab.`nn` IS NOT NULL)', [])
+    ),
+    (
+        ('tab', {'f': Fuzzy('x')}),
+        ('(tab.`f` LIKE %s)', ['%x%'])
+    ),
+    (
+        ('tab', {'f': Not(Fuzzy('x'))}),
+        ('((tab.`f` NOT LIKE %s OR tab.`f` IS NULL))', ['%x%'])
+    ),
+    (
+        ('tab', {'d': Range(28, 82)}),
+        ('(tab.`d` BETWEEN %s AND %s)', [28, 82])
+    ),
+    (
+        ('tab', {'d': Not(Range(28, 82))}),
+        ('(tab.`d` NOT BETWEEN %s AND %s)', [28, 82])
+    ),
+    (
+        ('tab', {'d': Range(28, None)}),
+        ('(tab.`d` >= %s)', [28])
+    ),
+    (
+        ('tab', {'d': Range(None, 82)}),
+        ('(tab.`d` <= %s)', [82])
+    ),
+    (
+        ('tab', {'d': Not(Range(28, None))}),
+        ('(tab.`d` < %s)', [28])
+    ),
+    (
+        ('tab', {'d': Not(Range(None, 82))}),
+        ('(tab.`d` > %s)', [82])
+    ),
+]
@@ -23,40 +23,35 @@ from jsa_proc.error import JSAProcError
 class DirectoryTestCase(TestCase):
     def test_directories(self):
         # Test all the directory functions.
-        self.assertEqual(
-            get_input_dir(18),
-            '/net/kamaka/export/data/jsa_proc/input/000/000000/000000018')
-
-        self.assertEqual(
-            get_output_dir(46),
-            '/net/kamaka/export/data/jsa_proc/output/000/000000/000000046')
-
-        self.assertEqual(
-            get_scratch_dir(92),
-            '/export/data/jsa_proc/scratch/000/000000/000000092')
-
-        self.assertEqual(
-            get_log_dir(844),
-            '/net/kamaka/export/data/jsa_proc/log/000/000000/000000844')
-
-        # Test longer job ID numbers (we know all the functions use the same
-        # private function to prepare the decimal number internally).
-        self.assertEqual(
-            get_log_dir(123456789),
-            '/net/kamaka/export/data/jsa_proc/log/123/123456/123456789')
-
-        self.assertEqual(
-            get_log_dir(22333),
-            '/net/kamaka/export/data/jsa_proc/log/000/000022/000022333')
-
-        self.assertEqual(
-            get_log_dir(22333999),
-            '/net/kamaka/export/data/jsa_proc/log/022/022333/022333999')
-
-        # Test what happens with a billion or more job IDs.
-        self.assertEqual(
-            get_log_dir(1999000999),
-            '/net/kamaka/export/data/jsa_proc/log/1999/1999000/1999000999')
+        for (function, job_id, expected) in directory_cases:
+            self.assertEqual(function(job_id), expected,
+                             '{0}({1})'.format(function.__name__, job_id))
 
         with self.assertRaises(JSAProcError):
             get_input_dir('not an integer')
+
+
+# Directory functions, with job identifiers and their expected directories.
+directory_cases = [
+    (get_input_dir, 18,
+     '/net/kamaka/export/data/jsa_proc/input/000/000000/000000018'),
+    (get_output_dir, 46,
+     '/net/kamaka/export/data/jsa_proc/output/000/000000/000000046'),
+    (get_scratch_dir, 92,
+     '/export/data/jsa_proc/scratch/000/000000/000000092'),
+    (get_log_dir, 844,
+     '/net/kamaka/export/data/jsa_proc/log/000/000000/000000844'),
+
+    # Test longer job ID numbers (we know all the functions use the same
+    # private function to prepare the decimal number internally).
+    (get_log_dir, 123456789,
+     '/net/kamaka/export/data/jsa_proc/log/123/123456/123456789'),
+    (get_log_dir, 22333,
+     '/net/kamaka/export/data/jsa_proc/log/000/000022/000022333'),
+    (get_log_dir, 22333999,
+     '/net/kamaka/export/data/jsa_proc/log/022/022333/022333999'),
+
+    # Test what happens with a billion or more job IDs.
+    (get_log_dir, 1999000999,
+     '/net/kamaka/export/data/jsa_proc/log/1999/1999000/1999000999'),
+]
@@ -21,27 +21,28 @@ from .db import DBTestCase
 
 class PollJACTestCase(DBTestCase):
     def test_poll_jac(self):
-        # A job which should pass validation:
-        job1 = self.db.add_job(
-            'tag1', 'JAC', 'obs', 'RECIPE_NAME', 'test', input_file_names=['f_1_01.sdf'])
+        (job1, job2, job3, job4, job5) = self.db.add_jobs([
+            dict(tag=tag, location='JAC', mode=mode, parameters='RECIPE_NAME',
+                 task='test', input_file_names=[input_file])
+            for (tag, mode, input_file) in (
+                # A job which should pass validation:
+                ('tag1', 'obs', 'f_1_01.sdf'),
 
-        # Jobs which should fail validation:
-        job2 = self.db.add_job(
-            'tag2', 'JAC', 'fortnight', 'RECIPE_NAME', 'test', input_file_names=['f_2_01.sdf'])
-        job3 = self.db.add_job(
-            'tag3', 'JAC', 'obs', 'RECIPE_NAME', 'test', input_file_names=[''])
-        job4 = self.db.add_job(
-            'tag4', 'JAC', 'obs', 'RECIPE_NAME', 'test', input_file_names=['/jcmtdata/f_4_01.sdf'])
-        job5 = self.db.add_job(
-            'tag5', 'JAC', 'obs', 'RECIPE_NAME', 'test', input_file_names=['f_4_01'])
+                # Jobs which should fail validation:
+                ('tag2', 'fortnight', 'f_2_01.sdf'),
+                ('tag3', 'obs', ''),
+                ('tag4', 'obs', '/jcmtdata/f_4_01.sdf'),
+                ('tag5', 'obs', 'f_4_01'),
+            )])
 
         # Run state machine.
         sm = JSAProcStateMachine(self.db)
         self.assertTrue(sm.poll_jac_jobs())
 
         # Check results of validation.
-        self.assertEqual(self.db.get_job(job1).state, JSAProcState.QUEUED)
-        self.assertEqual(self.db.get_job(job2).state, JSAProcState.ERROR)
-        self.assertEqual(self.db.get_job(job3).state, JSAProcState.ERROR)
-        self.assertEqual(self.db.get_job(job4).state, JSAProcState.ERROR)
-        self.assertEqual(self.db.get_job(job5).state, JSAProcState.ERROR)
+        jobs = self.db.get_jobs([job1, job2, job3, job4, job5])
+        self.assertEqual(jobs[job1].state, JSAProcState.QUEUED)
+        self.assertEqual(jobs[job2].state, JSAProcState.ERROR)
+        self.assertEqual(jobs[job3].state, JSAProcState.ERROR)
+        self.assertEqual(jobs[job4].state, JSAProcState.ERROR)
+        self.assertEqual(jobs[job5].state, JSAProcState.ERROR)
@@ -23,27 +23,9 @@ class StateTestCase(TestCase):
     def test_state_name(self):
         """Test lookup of state names."""
 
-        states = {
-            JSAProcState.UNKNOWN: 'Unknown',
-            JSAProcState.QUEUED: 'Queued',
-            JSAProcState.MISSING: 'Missing',
-            JSAProcState.FETCHING: 'Fetching',
-            JSAProcState.WAITING: 'Waiting',
-            JSAProcState.RUNNING: 'Running',
-            JSAProcState.PROCESSED: 'Processed',
-            JSAProcState.TRANSFERRING: 'Transferring',
-            JSAProcState.INGEST_QUEUE: 'Queued to reingest',
-            JSAProcState.INGEST_FETCH: 'Fetching to reingest',
-            JSAProcState.INGESTION: 'Waiting to ingest',
-            JSAProcState.INGESTING: 'Ingesting',
-            JSAProcState.COMPLETE: 'Complete',
-            JSAProcState.ERROR: 'Error',
-            JSAProcState.DELETED: 'Deleted',
-            JSAProcState.WONTWORK: 'Won\'t work',
-        }
-
-        for (state, name) in states.items():
-            self.assertEqual(JSAProcState.get_name(state), name)
+        for (state, name) in state_names:
+            self.assertEqual(JSAProcState.get_name(state), name,
+                             'name of state {0}'.format(state))
 
         with self.assertRaises(JSAProcError):
             JSAProcState.get_name('!')
@@ -72,3 +54,24 @@ class StateTestCase(TestCase):
                          False)
         self.assertEqual(JSAProcState.get_info(JSAProcState.DELETED).final,
                          True)
+
+
+# States with their expected names, for test_state_name.
+state_names = [
+    (JSAProcState.UNKNOWN, 'Unknown'),
+    (JSAProcState.QUEUED, 'Queued'),
+    (JSAProcState.MISSING, 'Missing'),
+    (JSAProcState.FETCHING, 'Fetching'),
+    (JSAProcState.WAITING, 'Waiting'),
+    (JSAProcState.RUNNING, 'Running'),
+    (JSAProcState.PROCESSED, 'Processed'),
+    (JSAProcState.TRANSFERRING, 'Transferring'),
+    (JSAProcState.INGEST_QUEUE, 'Queued to reingest'),
+    (JSAProcState.INGEST_FETCH, 'Fetching to reingest'),
+    (JSAProcState.INGESTION, 'Waiting to ingest'),
+    (JSAProcState.INGESTING, 'Ingesting'),
+    (JSAProcState.COMPLETE, 'Complete'),
+    (JSAProcState.ERROR, 'Error'),
+    (JSAProcState.DELETED, 'Deleted'),
+    (JSAProcState.WONTWORK, 'Won\'t work'),
+]
@@ -15,11 +15,12 @@
 
 from datetime import date, datetime
 
+from jsa_proc.db.db import JSAProcJob
 from jsa_proc.error import JSAProcError, NoRowsError
 from jsa_proc.state import JSAProcState
 from jsa_proc.submit.update import add_upd_del_job
 
-from .db import DBTestCase
+from .db import DBTestCase, jcmt_common_insert, jcmt_files_insert
 
 
 
@@ -30,23 +31,17 @@ class SubmitUpdateTest(DBTestCase):
 
     def test_child_job(self):
         # Create parent jobs.
-        job_1 = self.db.add_job(
-            'job-1', 'LOC', 'obs', 'PARAM', 'task-obs',
-            input_file_names=['a1.sdf', 'a2.sdf'])
-
-        self.assertIsInstance(job_1, int)
-
-        job_2 = self.db.add_job(
-            'job-2', 'LOC', 'obs', 'PARAM', 'task-obs',
-            input_file_names=['a3.sdf', 'a4.sdf'])
-
-        self.assertIsInstance(job_2, int)
-
-        job_3 = self.db.add_job(
-            'job-3', 'LOC', 'obs', 'PARAM', 'task-obs',
-            input_file_names=['a5.sdf', 'a6.sdf'])
-
-        self.assertIsInstance(job_3, int)
+        (job_1, job_2, job_3) = self.db.add_jobs([
+            dict(tag=tag, location='LOC', mode='obs', parameters='PARAM',
+                 task='task-obs', input_file_names=input_file_names)
+            for (tag, input_file_names) in (
+                ('job-1', ['a1.sdf', 'a2.sdf']),
+                ('job-2', ['a3.sdf', 'a4.sdf']),
+                ('job-3', ['a5.sdf', 'a6.sdf']),
+            )])
+
+        for job_id in (job_1, job_2, job_3):
+            self.assertIsInstance(job_id, int)
 
         # Try creating child job.
         kwargs = {
@@ -68,14 +63,15 @@ class SubmitUpdateTest(DBTestCase):
 
         self.assertIsInstance(job_id, int)
 
-        job = self.db.get_job(job_id)
+        job = self._compare_job(
+            job_id, JSAProcState.UNKNOWN, [], [job_1, job_2])
         self.assertEqual(
-            [job.id, job.tag, job.location, job.mode, job.parameters,
-             job.priority, job.task, job.state],
-            [job_id, 'tag-c-1', 'LOC', 'public', 'PARAM-C1', 50, 'task-coadd',
-             JSAProcState.UNKNOWN])
-
-        self._compare_job(job_id, JSAProcState.UNKNOWN, [], [job_1, job_2])
+            job,
+            JSAProcJob(
+                id=job_id, tag='tag-c-1', state=JSAProcState.UNKNOWN,
+                state_prev=JSAProcState.UNKNOWN, location='LOC',
+                foreign_id=None, mode='public', parameters='PARAM-C1',
+                priority=50, task='task-coadd', qa_state='?'))
 
         self.db.change_state(job_id, JSAProcState.COMPLETE, 'test')
 
@@ -151,25 +147,20 @@ class SubmitUpdateTest(DBTestCase):
 
     def test_regular_job(self):
         # Try creating a regular job.
-        obsinfo = {
-            'obsid': 'x', 'obsidss': 'x_450',
-            'utdate': 2017310, 'obsnum': 40, 'instrument': 'SCUBA-2',
-            'backend': 'SCUBA-2', 'subsys': '450',
-            'date_obs': datetime(2017, 3, 10, 14, 00, 00)}
+        obsinfo = regular_job_obsinfo
         with self.db.db as c:
-            c.execute('INSERT INTO jcmt.FILES (file_id, obsid, subsysnr, nsubscan, obsid_subsysnr) ' +
-                      'VALUES ("testfile.sdf", %s, %s, 100, %s)',
-                      (obsinfo['obsid'], obsinfo['subsys'], obsinfo['obsidss']))
-            c.execute('INSERT INTO jcmt.FILES (file_id, obsid, subsysnr, nsubscan, obsid_subsysnr) ' +
-                       'VALUES ("testfile2.sdf", "test-42", "1", 100, "test-42-1")',
-                       )
-            c.execute('INSERT INTO jcmt.COMMON (obsid, utdate, obsnum, instrume, backend, date_obs) ' +
-                      'VALUES (%s, %s, %s, %s, %s, %s)',
-                      (obsinfo['obsid'], obsinfo['utdate'], obsinfo['obsnum'], obsinfo['instrument'],
-                       obsinfo['backend'], obsinfo['date_obs']))
-            c.execute('INSERT INTO jcmt.COMMON (obsid, utdate, obsnum, instrume, backend, date_obs) ' +
-                      'VALUES ("test-42", 20190101, 5, "HARP", "DAS", %s)',
-                      (datetime(2019,1,1,9,0,0),))
+            c.executemany(jcmt_files_insert, [
+                ('testfile.sdf', obsinfo['obsid'], obsinfo['subsys'],
+                 obsinfo['obsidss']),
+                ('testfile2.sdf', 'test-42', '1', 'test-42-1'),
+            ])
+            c.executemany(jcmt_common_insert, [
+                (obsinfo['obsid'], obsinfo['utdate'], obsinfo['obsnum'],
+                 obsinfo['instrument'], obsinfo['backend'], None, None,
+                 obsinfo['date_obs']),
+                ('test-42', 20190101, 5, 'HARP', 'DAS', None, None,
+                 datetime(2019, 1, 1, 9, 0, 0)),
+            ])
             #c.execute('SELECT * from jcmt.COMMON')
             #print('COMMON', c.fetchall())
 
@@ -306,7 +297,7 @@ class SubmitUpdateTest(DBTestCase):
         self.assertEqual(job.state, state)
 
         if input_files:
-            self.assertEqual(sorted(self.db.get_input_files(job_id)),
+            self.assertEqual(self.db.get_input_files(job_id, sort=True),
                              sorted(input_files))
         else:
             with self.assertRaises(NoRowsError):
@@ -321,3 +312,10 @@ class SubmitUpdateTest(DBTestCase):
                 self.db.get_parents(job_id)
 
         return job
+
+
+regular_job_obsinfo = {
+    'obsid': 'x', 'obsidss': 'x_450',
+    'utdate': 2017310, 'obsnum': 40, 'instrument': 'SCUBA-2',
+    'backend': 'SCUBA-2', 'subsys': '450',
+    'date_obs': datetime(2017, 3, 10, 14, 00, 00)}